@@ -3,26 +3,59 @@ reddit_data_cleaner - A modular package for cleaning and structuring Reddit data
 
 This package contains:
 - cleaner.py: Core logic for processing raw Reddit CSVs using a local LLM (Ollama).
+- config.py: Ollama host/model, cleaning mode and concurrency settings.
 - flow.py: Prefect flow that orchestrates the cleaning process.
-- llm_runner.py: Builds prompts and manages LLM interaction (via Ollama).
-- preprocessor.py: (Optional) Handles content validation and pre-cleaning filters.
-- postprocessor.py: Handles post-cleaning transformations and formatting.
+- journal.py: Per-row JSONL journal for checkpointing and resuming a day's cleaning.
+- llm_runner.py: Builds prompts and manages LLM interaction (via Ollama), including the small/large model cascade.
+- preprocessor.py: Pre-cleaning filters, including the Naive Bayes triage that skips hopeless posts before the LLM.
+- fake_ollama.py: Local stand-in for the Ollama API, for trying the endpoint pool offline.
+- ollama_pool.py: Load-balanced, failover-aware client pool over every endpoint in OLLAMA_HOSTS.
+- postprocessor.py: Handles post-cleaning transformations, formatting and repair of malformed model JSON.
+- response_cache.py: On-disk LRU cache of model answers keyed by model, prompt version and post content.
+- structured_log.py: Queue-based JSON-lines logging for the per-row records of the cleaning hot loop.
 - utils.py: Shared file I/O and logging utilities.
+
+Submodules and the entry points below are imported lazily on first attribute access, so importing the
+package does not pull in pandas, prefect or ollama.
 """
 
-from . import cleaner, flow, llm_runner, preprocessor, postprocessor, utils
-from .cleaner import run_llm_cleaning_logic
-from .flow import reddit_llm_flow
+import importlib
+
+_LAZY_ATTRIBUTES = {
+    "run_llm_cleaning_logic": "cleaner",
+    "run_backfill": "cleaner",
+    "reddit_llm_flow": "flow",
+    "reddit_llm_backfill_flow": "flow",
+}
+
+_SUBMODULES = {"cleaner", "config", "fake_ollama", "flow", "journal", "llm_runner", "ollama_pool", "preprocessor", "postprocessor", "response_cache", "structured_log", "utils"}
 
 __version__ = "1.0.0"
 
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(f".{_LAZY_ATTRIBUTES[name]}", __name__)
+        return getattr(module, name)
+    if name in _SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 __all__ = [
     "run_llm_cleaning_logic",
+    "run_backfill",
     "reddit_llm_flow",
+    "reddit_llm_backfill_flow",
     "cleaner",
+    "config",
+    "fake_ollama",
     "flow",
+    "journal",
     "llm_runner",
+    "ollama_pool",
     "preprocessor",
     "postprocessor",
+    "response_cache",
+    "structured_log",
     "utils"
 ]
@@ -3,15 +3,155 @@
 import pandas as pd
 import time
 import logging
-from utils import get_paths, load_raw_data, should_skip_cleaning, save_cleaned_data
-from llm_runner import clean_single_row
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from utils import get_paths, find_uncleaned_days, load_raw_data, should_skip_cleaning, save_cleaned_data
+from llm_runner import plan_batches, clean_batch, warm_up_model, answer_outcome, endpoint_report
+from response_cache import ResponseCache
+from journal import CleaningJournal, journal_path
+from preprocessor import load_triage_model, triage_rows, save_labels, tokenizer_in_use
+from structured_log import component_logger, start_logging, stop_logging
+from config import (
+    CLEANING_MODE, LLM_MAX_IN_FLIGHT, MAX_ROWS, LLM_BATCH_SIZE, USE_RESPONSE_CACHE, RESUME_FROM_JOURNAL, USE_TRIAGE,
+    LLM_RETRY_ATTEMPTS, LLM_RETRY_MAX_ROWS, OLLAMA_MODEL, CASCADE_MODEL, STREAM_POLL_SECONDS,
+    BACKFILL_MAX_DAYS, LOG_DIR
+)
 
-def run_llm_cleaning_logic(logger=None):
+PROGRESS_EVERY_BATCHES = 10
+
+row_log = component_logger("row")
+
+
+def row_key(row):
+    return str(row.get("id", ""))
+
+
+def outcome_source(post):
+    # Who decided a row: the large model, the small cascade model (rejected before escalation) or nobody
+    if post is None:
+        return "empty"
+    return "cascade" if post.get("cascade_rejected") else "model"
+
+
+def clean_and_journal(batch, logger, cache=None, journal=None):
+    # The batch's rows are journaled as soon as it finishes, whatever order the worker threads finish in
+    start = time.perf_counter()
+    outcomes, counters = clean_batch(batch, logger, cache)
+    batch_ms = round((time.perf_counter() - start) * 1000, 1)
+    if journal is not None:
+        journal.append([
+            (int(idx), row_key(row), result, error, outcome_source(post))
+            for (idx, row, post), (result, error) in zip(batch, outcomes)
+        ])
+    for (idx, row, post), (result, error) in zip(batch, outcomes):
+        status = "error" if error else "valid" if result else "invalid" if post is not None else "empty"
+        row_log.info("row", extra={"fields": {
+            "row": int(idx), "post_id": row_key(row), "status": status, "batch_rows": len(batch), "batch_ms": batch_ms,
+            "cached": bool(post and post.get("cached_answer") is not None)
+        }})
+    return outcomes, counters
+
+
+def apply_triage(pending, journal, logger):
+    # Drops rows the triage model is confident are invalid (journaled as plain skips); in shadow mode
+    # everything is kept and the would-be skips are only counted
+    try:
+        model = load_triage_model(logger)
+    except Exception as e:
+        logger.warning(f"⚠️ Triage unavailable, sending every row to the LLM: {e}")
+        return pending, 0
+    kept, below = triage_rows(pending, model)
+    if not model.enabled:
+        logger.info(f"🧮 Triage in shadow mode (cross-validated AUC {model.report.get('auc', 0):.2f}): "
+                    f"would have skipped {len(below)} of {len(pending)} row(s)")
+        return pending, 0
+    journal.append([(int(idx), row_key(row), None, None, "triage") for idx, row in below])
+    logger.info(f"🧮 Triage skipped {len(below)} of {len(pending)} row(s) below P(valid) {model.threshold:.3f}")
+    return kept, len(below)
+
+
+def clean_batches_serial(batches, logger, cache=None, journal=None):
+    for batch in batches:
+        yield clean_and_journal(batch, logger, cache, journal)
+
+
+def clean_batches_parallel(batches, logger, cache=None, journal=None, max_in_flight=LLM_MAX_IN_FLIGHT, executor=None):
+    # Keeps up to max_in_flight chat requests open against Ollama; executor.map yields each batch's
+    # outcomes in row order, so everything downstream sees the same sequence as the serial loop.
+    # A backfill passes its own executor, shared by every day it cleans.
+    if executor is not None:
+        yield from executor.map(lambda batch: clean_and_journal(batch, logger, cache, journal), batches)
+        return
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="llm") as executor:
+        yield from executor.map(lambda batch: clean_and_journal(batch, logger, cache, journal), batches)
+
+
+def clean_batches(batches, logger, cache=None, journal=None, executor=None):
+    if CLEANING_MODE == "parallel" and LLM_MAX_IN_FLIGHT > 1:
+        return clean_batches_parallel(batches, logger, cache, journal, executor=executor)
+    return clean_batches_serial(batches, logger, cache, journal)
+
+
+def retry_failed_rows(pending, logger, cache, journal, counters, executor=None):
+    # Rows whose answer could not be repaired get up to LLM_RETRY_ATTEMPTS more single-post requests
+    # (at most LLM_RETRY_MAX_ROWS per pass); the new journal entries replace the failed ones
+    for attempt in range(1, LLM_RETRY_ATTEMPTS + 1):
+        entries = journal.load()
+        failed = [(idx, row) for idx, row in pending
+                  if (entries.get(row_key(row)) or {}).get("error")][:LLM_RETRY_MAX_ROWS]
+        if not failed:
+            return
+        logger.info(f"🔂 Retry pass {attempt}/{LLM_RETRY_ATTEMPTS}: re-running {len(failed)} unrecoverable row(s)")
+        counters['retried_rows'] += len(failed)
+        for _, batch_counters in clean_batches(plan_batches(failed, 1, cache=cache), logger, cache, journal, executor):
+            counters.update(batch_counters)
+        entries = journal.load()
+        counters['retry_recovered'] += sum(1 for _, row in failed if entries[row_key(row)]["error"] is None)
+
+
+def save_from_journal(rows, journal, cleaned_file, logger):
+    # The final file is assembled from the journal in row order, so rows finished by an earlier attempt are included.
+    # Returns (results, skipped count).
+    results, failure_log = [], []
+    skipped_count = 0
+    entries = journal.load()
+    for idx, row in rows:
+        entry = entries.get(row_key(row))
+        if entry is None:
+            skipped_count += 1
+        elif entry["result"]:
+            results.append(entry["result"])
+        elif entry["error"]:
+            failure_log.append(entry["error"])
+            skipped_count += 1
+        else:
+            skipped_count += 1
+
+    cleaned_df = pd.DataFrame(results)
+
+    if 'post_id' in cleaned_df.columns:
+        columns = ['post_id'] + [col for col in cleaned_df.columns if col != 'post_id']
+        cleaned_df = cleaned_df[columns]
+
+    save_cleaned_data(cleaned_df, cleaned_file, failure_log, logger)
+    if cleaned_file.exists():
+        # The model's own verdicts are the triage training labels; skips and failures say nothing about the post
+        save_labels(cleaned_file.stem.rsplit("_", 1)[-1], {
+            post_id: bool(entry["result"]) for post_id, entry in entries.items()
+            if entry.get("source") == "model" and entry["error"] is None
+        })
+        journal.remove()
+    return results, skipped_count
+
+
+def run_llm_cleaning_logic(logger=None, day=None, executor=None):
+    # Cleans one day (today by default) and returns a short summary of it, or None when there was nothing to do
     if logger is None:
         logging.basicConfig(level=logging.INFO)
         logger = logging.getLogger("LLM Cleaner")
 
-    raw_dir, cleaned_dir, raw_file, cleaned_file = get_paths()
+    raw_dir, cleaned_dir, raw_file, cleaned_file = get_paths(day)
+    day = cleaned_file.stem.rsplit("_", 1)[-1]
 
     if not raw_dir.exists():
         logger.error(f"❌ RAW data directory not found: {raw_dir}")
@@ -27,31 +167,241 @@ def run_llm_cleaning_logic(logger=None):
         return
 
     logger.info(f"✅ Loaded {len(df)} rows from raw data.")
-    results, failure_log = [], []
-    skipped_count = 0
     start_time = time.time()
+    rows = list((df if MAX_ROWS is None else df.head(MAX_ROWS)).iterrows())
+    journal = CleaningJournal(journal_path(cleaned_file))
+    if not RESUME_FROM_JOURNAL:
+        journal.remove()
+    completed = journal.completed()
+    pending = [(idx, row) for idx, row in rows if row_key(row) not in completed]
+    resumed = len(rows) - len(pending)
+    if completed:
+        logger.info(f"♻️ Resuming from {journal.path}: {resumed} row(s) already done, {len(pending)} to go")
 
-    for idx, row in df.head(5).iterrows():
-        result, error = clean_single_row(row, idx, logger)
-        if result:
-            results.append(result)
-        elif error:
-            failure_log.append(error)
-            skipped_count += 1
+    counters = Counter()
+    if USE_TRIAGE and pending:
+        pending, counters['triage_skipped'] = apply_triage(pending, journal, logger)
+
+    cache = ResponseCache() if USE_RESPONSE_CACHE else None
+    log_file = LOG_DIR / f"cleaning_{day}.jsonl"
+    start_logging(log_file)
+    logger.info(f"🗒️ Per-row records go to {log_file}")
+    try:
+        batches = plan_batches(pending, LLM_BATCH_SIZE, cache=cache)
+        live_posts = sum(1 for batch in batches for _, _, post in batch
+                         if post is not None and post.get("cached_answer") is None)
+        for batch in batches:
+            for idx, _, post in batch:
+                if post is not None and "tokens_before" in post:
+                    counters['tokens_before_compaction'] += post["tokens_before"]
+                    counters['tokens_after_compaction'] += post["tokens_after"]
+                    counters['compacted_rows'] += 1
+                    logger.debug(f"✂️ [Row {idx}] compacted {post['tokens_before']} -> {post['tokens_after']} tokens")
+        logger.info(f"📦 Planned {len(batches)} batch(es) of up to {LLM_BATCH_SIZE} post(s) for {len(pending)} rows "
+                    f"({live_posts} post(s) need the model)")
+
+        if live_posts:
+            try:
+                warm_up_model(logger)
+            except Exception as e:
+                logger.error(f"❌ Could not warm up the model: {e}")
+                raise
+
+        if CLEANING_MODE == "parallel" and LLM_MAX_IN_FLIGHT > 1:
+            logger.info(f"⚡ Cleaning with up to {LLM_MAX_IN_FLIGHT} requests in flight")
         else:
-            skipped_count += 1
+            logger.info("🐢 Cleaning serially")
 
-    cleaned_df = pd.DataFrame(results)
+        for done, (_, batch_counters) in enumerate(clean_batches(batches, logger, cache, journal, executor), 1):
+            counters.update(batch_counters)
+            if done % PROGRESS_EVERY_BATCHES == 0 or done == len(batches):
+                logger.info(f"⏳ [{day}] {done}/{len(batches)} batch(es) done")
 
-    if 'post_id' in cleaned_df.columns:
-        columns = ['post_id'] + [col for col in cleaned_df.columns if col != 'post_id']
-        cleaned_df = cleaned_df[columns]
+        retry_failed_rows(pending, logger, cache, journal, counters, executor)
+    finally:
+        if cache is not None:
+            cache.close()
+        stop_logging()
 
-    save_cleaned_data(cleaned_df, cleaned_file, failure_log, logger)
+    results, skipped_count = save_from_journal(rows, journal, cleaned_file, logger)
 
     logger.info("📊 Stats:")
     logger.info(f" Total rows: {len(df)}")
+    logger.info(f" Rows processed: {len(rows)} ({resumed} resumed from the journal)")
     logger.info(f" Cleaned entries: {len(results)}")
     logger.info(f" Skipped/Errors: {skipped_count}")
+    logger.info(f" Skipped by triage before the LLM: {counters['triage_skipped']}")
+    if counters['compacted_rows']:
+        saved = counters['tokens_before_compaction'] - counters['tokens_after_compaction']
+        logger.info(f" Input compaction: {counters['tokens_before_compaction']} -> {counters['tokens_after_compaction']} "
+                    f"post tokens, {saved} saved ({saved / counters['compacted_rows']:.0f} per row)")
+    if tokenizer_in_use() is not None:
+        logger.info(f" Token counts from: {tokenizer_in_use()}")
+    logger.info(f" LLM requests: {counters['llm_requests']}")
+    logger.info(f" Posts answered in batches: {counters['batched_posts']}")
+    logger.info(f" Single-post retries after batch failures: {counters['single_post_retries']}")
+    if cache is not None:
+        lookups = counters['cache_hits'] + counters['cache_misses']
+        hit_rate = counters['cache_hits'] / lookups * 100 if lookups else 0.0
+        logger.info(f" Response cache: {counters['cache_hits']} hits / {counters['cache_misses']} misses "
+                    f"({hit_rate:.1f}% hit rate), {cache.stats['stores']} stored, {cache.stats['evictions']} evicted")
+    requests = max(counters['llm_requests'], 1)
+    completed = max(counters['completed_requests'], 1)
+    logger.info(f" Prompt eval over the {counters['completed_requests']} completed request(s): "
+                f"{counters['prompt_eval_tokens']} tokens in {counters['prompt_eval_ms'] / 1000:.1f}s "
+                f"(avg {counters['prompt_eval_ms'] / completed:.0f} ms/request)")
+    logger.info(f" Generation: {counters['eval_tokens']} tokens ({counters['eval_tokens'] / requests:.0f} tokens/request), "
+                f"{counters['eval_ms'] / 1000:.1f}s over the completed requests (avg {counters['eval_ms'] / completed:.0f} ms/request)")
+    logger.info(f" Generations cancelled early on an invalid verdict: {counters['early_aborts']}")
+    if counters['screen_requests']:
+        escalated = counters['screen_requests'] - counters['cascade_rejected']
+        logger.info(f" Cascade routing ({CASCADE_MODEL} -> {OLLAMA_MODEL}): {counters['screen_requests']} screened "
+                    f"({counters['screened_valid']} valid / {counters['screened_unsure']} unsure / "
+                    f"{counters['screened_invalid']} invalid), {escalated} escalated, "
+                    f"{counters['cascade_rejected']} rejected by the small model alone")
+        logger.info(f" Tier latency: {CASCADE_MODEL} {counters['screen_ms'] / counters['screen_requests']:.0f} ms/request, "
+                    f"{OLLAMA_MODEL} {counters['request_ms'] / requests:.0f} ms/request")
+        decided = max(counters['audit_decided'], 1)
+        logger.info(f" Cascade agreement on {counters['audited']} held-out post(s): {counters['audit_agreed']}/"
+                    f"{counters['audit_decided']} ({counters['audit_agreed'] / decided * 100:.1f}%), small-model rejections "
+                    f"confirmed by {OLLAMA_MODEL}: {counters['audit_rejected_confirmed']}/{counters['audit_rejected']}")
+    pool = endpoint_report()
+    if pool is not None:
+        endpoints, failovers = pool
+        for endpoint in endpoints:
+            logger.info(f" Endpoint {endpoint['host']} ({'up' if endpoint['healthy'] else 'down'}): "
+                        f"{endpoint['requests']} requests, avg {endpoint['avg_ms']:.0f} ms, p95 {endpoint['p95_ms']:.0f} ms, "
+                        f"{endpoint['failures']} failures")
+        logger.info(f" Requests failed over to another endpoint: {failovers}")
+    repairs = {key[len('repair_'):]: count for key, count in sorted(counters.items()) if key.startswith('repair_') and count}
+    logger.info(f" Malformed answers repaired without another call: {counters['repaired_responses']} "
+                f"({', '.join(f'{fix}: {count}' for fix, count in repairs.items()) or 'none'})")
+    logger.info(f" Unrecoverable answers: {counters['unrecoverable_responses']}, "
+                f"rows retried: {counters['retried_rows']}, recovered by the retry pass: {counters['retry_recovered']}")
     logger.info(f"🕒 Total cleaning time: {time.time() - start_time:.2f} seconds")
     logger.info("🎉 Cleaning completed.")
+    return {"day": day, "rows": len(rows), "cleaned": len(results), "skipped": skipped_count,
+            "llm_requests": counters['llm_requests'], "seconds": time.time() - start_time}
+
+
+def run_backfill(logger=None, days=None, max_days=BACKFILL_MAX_DAYS):
+    # Cleans every raw day that has no cleaned file yet (or the given days), oldest first, in one process. All days
+    # go through one worker pool, so LLM_MAX_IN_FLIGHT holds for the whole catch-up, and the model is warmed once.
+    # A day that fails is logged and left for the next run; its journal keeps whatever it finished.
+    if logger is None:
+        logging.basicConfig(level=logging.INFO)
+        logger = logging.getLogger("LLM Cleaner")
+
+    raw_dir, cleaned_dir, _, _ = get_paths()
+    days = list(days) if days else find_uncleaned_days(raw_dir, cleaned_dir)
+    if max_days:
+        days = days[:max_days]
+    if not days:
+        logger.info("✅ Every raw day already has a cleaned file, nothing to backfill.")
+        return []
+
+    logger.info(f"📅 Backfilling {len(days)} day(s): {', '.join(days)}")
+    summaries = []
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=max(LLM_MAX_IN_FLIGHT, 1), thread_name_prefix="llm") as executor:
+        for n, day in enumerate(days, 1):
+            logger.info(f"📅 [{n}/{len(days)}] Cleaning {day}")
+            try:
+                summary = run_llm_cleaning_logic(logger, day=day, executor=executor)
+            except Exception as e:
+                logger.error(f"❌ [{day}] Cleaning failed, leaving it for the next run: {e}")
+                summary = {"day": day, "error": str(e)}
+            summaries.append(summary or {"day": day})
+            elapsed = time.time() - start_time
+            logger.info(f"📅 [{n}/{len(days)}] {day} finished, {elapsed / 60:.1f} min elapsed, "
+                        f"~{elapsed / n * (len(days) - n) / 60:.1f} min left")
+
+    logger.info("📊 Backfill:")
+    for summary in summaries:
+        if "error" in summary:
+            logger.info(f" {summary['day']}: failed ({summary['error']})")
+        elif "rows" in summary:
+            logger.info(f" {summary['day']}: {summary['cleaned']} cleaned / {summary['rows']} rows, "
+                        f"{summary['llm_requests']} LLM requests in {summary['seconds']:.0f}s")
+        else:
+            logger.info(f" {summary['day']}: nothing to clean")
+    logger.info(f"🕒 Total backfill time: {time.time() - start_time:.2f} seconds")
+    return summaries
+
+
+def run_streaming_cleaning(logger=None, day=None, poll_seconds=STREAM_POLL_SECONDS):
+    # Consumer side of the extractor's work queue. Posts are leased LLM_BATCH_SIZE * LLM_MAX_IN_FLIGHT at a time
+    # while extraction is still running, cleaned through the usual batches/cache/journal, and acked once journaled;
+    # failed ones are released for another attempt. Items left leased by a crashed consumer come back when their
+    # lease expires, and those already in the journal are acked without another model call. Once the producer has
+    # finished and the queue is drained, the day's cleaned file is written from the journal as in the batch run.
+    # day must be the day the producer queues its posts under (today by default).
+    if logger is None:
+        logging.basicConfig(level=logging.INFO)
+        logger = logging.getLogger("LLM Cleaner")
+    # Imported here so that importing the cleaner does not need the extractor package on the path
+    from reddit_data_extractor.work_queue import WorkQueue
+
+    _, cleaned_dir, _, cleaned_file = get_paths(day)
+    cleaned_dir.mkdir(parents=True, exist_ok=True)
+    if should_skip_cleaning(cleaned_file, logger):
+        return
+
+    day = cleaned_file.stem.rsplit("_", 1)[-1]
+    queue = WorkQueue()
+    journal = CleaningJournal(journal_path(cleaned_file))
+    cache = ResponseCache() if USE_RESPONSE_CACHE else None
+    counters = Counter()
+    warmed = False
+    start_time = time.time()
+    log_file = LOG_DIR / f"cleaning_{day}.jsonl"
+    start_logging(log_file)
+    logger.info(f"📬 Streaming cleaner waiting on the work queue for {day} (per-row records go to {log_file})")
+    try:
+        while True:
+            leased = queue.lease(day, LLM_BATCH_SIZE * max(LLM_MAX_IN_FLIGHT, 1))
+            if not leased:
+                if queue.drained(day):
+                    break
+                time.sleep(poll_seconds)
+                continue
+
+            completed = journal.completed()
+            done = [item_id for item_id, post in leased if row_key(post) in completed]
+            chunk = [(item_id, post) for item_id, post in leased if row_key(post) not in completed]
+            counters['resumed'] += len(done)
+            failed = []
+            if chunk:
+                batches = plan_batches(chunk, LLM_BATCH_SIZE, cache=cache)
+                if not warmed and any(post is not None and post.get("cached_answer") is None
+                                      for batch in batches for _, _, post in batch):
+                    warm_up_model(logger)
+                    warmed = True
+                for batch, (outcomes, batch_counters) in zip(batches, clean_batches(batches, logger, cache, journal)):
+                    counters.update(batch_counters)
+                    for (item_id, _, _), (_, error) in zip(batch, outcomes):
+                        (failed if error else done).append(item_id)
+            queue.ack(done)
+            queue.release(failed)
+            counters['acked'] += len(done)
+            counters['released'] += len(failed)
+            logger.info(f"📬 Leased {len(leased)} post(s): {len(done)} acked, {len(failed)} released for retry "
+                        f"({counters['acked']} done so far, queue {queue.counts(day)})")
+    finally:
+        if cache is not None:
+            cache.close()
+        stop_logging()
+
+    rows = queue.items(day)
+    queue.close()
+    results, skipped_count = save_from_journal(rows, journal, cleaned_file, logger)
+
+    logger.info("📊 Stats:")
+    logger.info(f" Posts streamed from the work queue: {len(rows)} ({counters['resumed']} already in the journal)")
+    logger.info(f" Cleaned entries: {len(results)}")
+    logger.info(f" Skipped/Errors: {skipped_count}")
+    logger.info(f" Released for another attempt: {counters['released']}")
+    logger.info(f" LLM requests: {counters['llm_requests']}")
+    logger.info(f" Posts answered in batches: {counters['batched_posts']}")
+    logger.info(f"🕒 Total streaming time: {time.time() - start_time:.2f} seconds")
+    logger.info("🎉 Cleaning completed.")
@@ -0,0 +1,112 @@
+# This file contains Configs for the LLM cleaner (Ollama host/model, concurrency, row limits)
+
+import os
+from pathlib import Path
+
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+# Several endpoints, comma-separated (e.g. "http://localhost:11434,http://localhost:11435,http://10.0.0.7:11434"),
+# are load-balanced by ollama_pool; set LLM_MAX_IN_FLIGHT to the sum of their OLLAMA_NUM_PARALLEL slots.
+# A dead endpoint is probed again every OLLAMA_HEALTH_CHECK_SECONDS.
+OLLAMA_HOSTS = [host.strip() for host in os.getenv("OLLAMA_HOSTS", OLLAMA_HOST).split(",") if host.strip()]
+OLLAMA_HEALTH_CHECK_SECONDS = float(os.getenv("OLLAMA_HEALTH_CHECK_SECONDS", "15"))
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "mistral")
+
+# Cleaning mode: "parallel" keeps up to LLM_MAX_IN_FLIGHT chat requests open against Ollama,
+# "serial" is the original one-row-at-a-time loop. Match LLM_MAX_IN_FLIGHT to OLLAMA_NUM_PARALLEL on the server.
+CLEANING_MODE = os.getenv("LLM_CLEANING_MODE", "parallel")
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "4"))
+
+# Rows cleaned per day; empty means the whole frame (set e.g. 5 for a quick smoke run)
+MAX_ROWS = int(os.getenv("LLM_MAX_ROWS")) if os.getenv("LLM_MAX_ROWS") else None
+
+# Micro-batching: up to LLM_BATCH_SIZE posts share one request (and one copy of the system prompt).
+# Batches are also cut so that prompt + NUM_PREDICT answer tokens per post fit in LLM_CONTEXT_TOKENS (sent as num_ctx).
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", "4"))
+LLM_CONTEXT_TOKENS = int(os.getenv("LLM_CONTEXT_TOKENS", "8192"))
+
+# Model residency: every request asks Ollama to keep the model loaded this long after it finishes,
+# and the cleaner waits up to OLLAMA_READY_TIMEOUT seconds for the server before warming the model
+LLM_KEEP_ALIVE = os.getenv("LLM_KEEP_ALIVE", "30m")
+OLLAMA_READY_TIMEOUT = int(os.getenv("OLLAMA_READY_TIMEOUT", "120"))
+
+# Paths
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+DATA_DIR = PROJECT_ROOT / "data"
+STATE_DIR = DATA_DIR / "state"
+
+# Structured logging: per-row records of the cleaning hot loop (request timings, cascade verdicts, prompts and answers)
+# are written as JSON lines to LOG_DIR/cleaning_<day>.jsonl by a background thread; only warnings and errors also reach
+# the console. LLM_LOG_LEVELS sets a level per component, e.g. "llm=DEBUG,payload=WARNING". Full prompts and answers
+# are logged for failed requests and for a LLM_LOG_PAYLOAD_SAMPLE share of the others.
+LOG_DIR = Path(os.getenv("LLM_LOG_DIR", PROJECT_ROOT / "logs"))
+LOG_LEVELS = {"row": "INFO", "llm": "INFO", "cascade": "INFO", "payload": "INFO", "pool": "INFO"}
+LOG_LEVELS.update(
+    (component.strip(), level.strip().upper())
+    for component, _, level in (item.partition("=") for item in os.getenv("LLM_LOG_LEVELS", "").split(","))
+    if level.strip()
+)
+LOG_PAYLOAD_SAMPLE = float(os.getenv("LLM_LOG_PAYLOAD_SAMPLE", "0.01"))
+
+# Content-addressed cache of model answers (valid and invalid), keyed by model, prompt version and post content.
+# Least recently used entries are evicted once the cache holds more than RESPONSE_CACHE_MAX_ENTRIES answers.
+USE_RESPONSE_CACHE = os.getenv("LLM_USE_RESPONSE_CACHE", "1") == "1"
+RESPONSE_CACHE_FILE = STATE_DIR / "llm_response_cache.sqlite3"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("LLM_RESPONSE_CACHE_MAX_ENTRIES", "50000"))
+
+# Per-row journal of finished rows; with LLM_RESUME on, a retried/restarted run continues from it
+JOURNAL_DIR = STATE_DIR / "journal"
+RESUME_FROM_JOURNAL = os.getenv("LLM_RESUME", "1") == "1"
+
+# Pre-LLM triage: posts whose predicted P(valid) is below the model's threshold are skipped without a model call.
+# The threshold is calibrated by cross-validation to keep TRIAGE_TARGET_RECALL of the valid posts (LLM_TRIAGE_THRESHOLD
+# overrides it), and the model only skips anything once its cross-validated AUC reaches TRIAGE_MIN_AUC; below that it
+# runs in shadow mode and just reports what it would have skipped. It is retrained whenever the history changes.
+USE_TRIAGE = os.getenv("LLM_TRIAGE", "1") == "1"
+TRIAGE_THRESHOLD = float(os.getenv("LLM_TRIAGE_THRESHOLD")) if os.getenv("LLM_TRIAGE_THRESHOLD") else None
+TRIAGE_TARGET_RECALL = 0.95
+TRIAGE_MIN_AUC = 0.65
+TRIAGE_MODEL_FILE = STATE_DIR / "triage_model.json"
+# Training labels: the verdicts the model gave for the posts actually sent to it, one file per cleaned day. Days up
+# to LLM_TRIAGE_LEGACY_LAST_DAY were cleaned by the original loop over df.head(5), so their first 5 raw rows are
+# labelled by whether they reached the cleaned file; set it empty to train on the label files only.
+TRIAGE_LABELS_DIR = STATE_DIR / "triage_labels"
+TRIAGE_LEGACY_LAST_DAY = os.getenv("LLM_TRIAGE_LEGACY_LAST_DAY", "2025-11-13")
+TRIAGE_LEGACY_ROWS_PER_DAY = 5
+
+# Input compaction: text is normalized (markdown, URLs, quotes, sign-offs) and each field is cut to a token budget,
+# counted with the model's own tokenizer (LLM_TOKENIZER, a Hugging Face tokenizer id); without transformers or
+# network access the counts fall back to a ~4 characters per token estimate. The default is an ungated copy of the
+# tokenizer of Ollama's `mistral` (Mistral 7B Instruct v0.3), so CI can download it without a Hugging Face token;
+# the cleaning summary names the tokenizer that was actually used.
+USE_COMPACTION = os.getenv("LLM_COMPACTION", "1") == "1"
+TOKENIZER_NAME = os.getenv("LLM_TOKENIZER", "unsloth/mistral-7b-instruct-v0.3")
+TITLE_TOKEN_BUDGET = 64
+SELFTEXT_TOKEN_BUDGET = 512
+COMMENT_TOKEN_BUDGET = 160  # per comment
+
+# Output decoding: answers are constrained to the JSON schema in llm_runner (Ollama `format`), capped at
+# NUM_PREDICT tokens per post (also the answer space plan_batches reserves), and streamed so generation is cancelled as soon as every expected answer
+# in the request has come back "is_valid": false
+USE_STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "1") == "1"
+STREAM_EARLY_ABORT = os.getenv("LLM_EARLY_ABORT", "1") == "1"
+NUM_PREDICT = int(os.getenv("LLM_NUM_PREDICT", "384"))
+
+# Retry pass: rows whose answer is still unparseable after JSON repair are re-run on their own, at most
+# LLM_RETRY_MAX_ROWS rows per pass and LLM_RETRY_ATTEMPTS passes per run
+LLM_RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "1"))
+LLM_RETRY_MAX_ROWS = int(os.getenv("LLM_RETRY_MAX_ROWS", "50"))
+
+# Small/large model cascade: each post is first screened by CASCADE_MODEL, which only answers valid/invalid/unsure.
+# Posts it rejects are dropped without reaching OLLAMA_MODEL; the rest are escalated for extraction. A fixed
+# CASCADE_AUDIT_RATE share of posts (picked by post id) always goes to both tiers to measure how often they agree.
+USE_CASCADE = os.getenv("LLM_CASCADE", "1") == "1"
+CASCADE_MODEL = os.getenv("LLM_CASCADE_MODEL", "qwen2.5:0.5b")
+CASCADE_AUDIT_RATE = float(os.getenv("LLM_CASCADE_AUDIT_RATE", "0.1"))
+
+# Streaming mode (run_pipeline.py stream): the cleaner leases posts from the extractor's work queue while extraction
+# is still running, polling every STREAM_POLL_SECONDS when the queue is empty
+STREAM_POLL_SECONDS = float(os.getenv("LLM_STREAM_POLL_SECONDS", "2"))
+
+# Backfill (run_pipeline.py backfill): every raw day without a cleaned file is cleaned in one process, oldest first;
+# LLM_BACKFILL_MAX_DAYS caps how many days one run takes on
+BACKFILL_MAX_DAYS = int(os.getenv("LLM_BACKFILL_MAX_DAYS")) if os.getenv("LLM_BACKFILL_MAX_DAYS") else None
@@ -0,0 +1,161 @@
+# fake_ollama.py — Offline stand-in for the Ollama endpoints the cleaner uses
+#
+# Serves just enough of the Ollama API for llm_runner and ollama_pool:
+#   POST /api/chat      -> a canned answer, streamed as NDJSON chunks or as one JSON body ("stream": false)
+#   GET  /api/tags      -> empty model list (the pool's health check)
+#   GET  /api/version   -> fixed version
+# The answer follows the request: a batch prompt gets one invalid verdict per POST ID, a screening request
+# (format schema with a "verdict") gets "unsure", anything else a single invalid answer. Each chat is delayed
+# by a fixed latency, so several stand-ins with different latencies show how the pool spreads load.
+#
+# Run it directly for a demo: it starts a few stand-ins, pushes concurrent requests through an OllamaClientPool,
+# stops one endpoint halfway and prints the per-endpoint report.
+
+import argparse
+import json
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+POST_ID = re.compile(r'^POST ID\n(\S+)$', re.MULTILINE)
+
+
+def canned_answer(request):
+    schema = request.get('format')
+    if isinstance(schema, dict) and 'verdict' in schema.get('properties', {}):
+        return {"verdict": "unsure"}
+    prompt = next((m['content'] for m in reversed(request.get('messages', [])) if m.get('role') == 'user'), '')
+    post_ids = POST_ID.findall(prompt)
+    if post_ids:
+        return [{"post_id": post_id, "is_valid": False, "problem": None, "solution": None} for post_id in post_ids]
+    return {"is_valid": False, "problem": None, "solution": None}
+
+
+class FakeOllama:
+    def __init__(self, latency_ms=200, chunk_chars=16):
+        self.latency = latency_ms / 1000
+        self.chunk_chars = chunk_chars
+        self._lock = threading.Lock()
+        self.request_counts = Counter()
+        self.server = None
+        self.stopped = False
+
+    def chat_chunks(self, request, content):
+        # Final chunk carries the timing fields Ollama reports (durations in ns)
+        model = request.get('model', 'fake')
+        for i in range(0, len(content), self.chunk_chars):
+            yield {'model': model, 'message': {'role': 'assistant', 'content': content[i:i + self.chunk_chars]}, 'done': False}
+        duration = int(self.latency * 1e9)
+        yield {
+            'model': model, 'message': {'role': 'assistant', 'content': ''}, 'done': True, 'done_reason': 'stop',
+            'total_duration': duration, 'load_duration': 0,
+            'prompt_eval_count': len(json.dumps(request.get('messages', []))) // 4, 'prompt_eval_duration': duration // 4,
+            'eval_count': len(content) // 4, 'eval_duration': duration - duration // 4,
+        }
+
+    def make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _send_json(self, status, body):
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=UTF-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _dropped(self):
+                # After stop(), kept-alive connections are hung up on without an answer, like a crashed server
+                if fake.stopped:
+                    self.close_connection = True
+                return fake.stopped
+
+            def do_GET(self):
+                if self._dropped():
+                    return
+                with fake._lock:
+                    fake.request_counts[self.path] += 1
+                if self.path == '/api/tags':
+                    self._send_json(200, {'models': []})
+                elif self.path == '/api/version':
+                    self._send_json(200, {'version': '0.0.0-fake'})
+                else:
+                    self._send_json(404, {'error': 'not found'})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                request = json.loads(self.rfile.read(length) or b'{}')
+                if self._dropped():
+                    return
+                with fake._lock:
+                    fake.request_counts[self.path] += 1
+                if self.path != '/api/chat':
+                    self._send_json(404, {'error': 'not found'})
+                    return
+                time.sleep(fake.latency)
+                chunks = list(fake.chat_chunks(request, json.dumps(canned_answer(request))))
+                if request.get('stream', True) is False:
+                    final = dict(chunks[-1])
+                    final['message'] = {'role': 'assistant', 'content': ''.join(c['message']['content'] for c in chunks)}
+                    self._send_json(200, final)
+                    return
+                payload = b''.join(json.dumps(chunk).encode('utf-8') + b'\n' for chunk in chunks)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self, host='127.0.0.1', port=0):
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self.server.server_address[1]}"
+
+    def stop(self):
+        self.stopped = True
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+if __name__ == "__main__":
+    from ollama_pool import OllamaClientPool
+
+    parser = argparse.ArgumentParser(description="Load-balance requests over local Ollama stand-ins")
+    parser.add_argument("--latencies-ms", default="100,200,400", help="One stand-in per comma-separated latency")
+    parser.add_argument("--requests", type=int, default=120)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    fakes = [FakeOllama(latency_ms=float(ms)) for ms in args.latencies_ms.split(",")]
+    hosts = [fake.start() for fake in fakes]
+    pool = OllamaClientPool(hosts, health_check_seconds=2)
+
+    def one_request(i):
+        if i == args.requests // 2:
+            fakes[0].stop()
+            print(f"Stopped {hosts[0]}")
+        stream = pool.chat(model="fake", messages=[{"role": "user", "content": f"POST ID\np{i}\n\n"}], stream=True)
+        return "".join(chunk["message"]["content"] for chunk in stream)
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        answers = list(executor.map(one_request, range(args.requests)))
+    print(f"{len(answers)} requests in {time.time() - start:.1f}s, {pool.failovers} failovers")
+    for endpoint in pool.report():
+        print(f"  {endpoint['host']}: {endpoint['requests']} requests, avg {endpoint['avg_ms']:.0f} ms, "
+              f"p95 {endpoint['p95_ms']:.0f} ms, {endpoint['failures']} failures, {'up' if endpoint['healthy'] else 'down'}")
+    for fake in fakes[1:]:
+        fake.stop()
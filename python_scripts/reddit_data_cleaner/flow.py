@@ -13,7 +13,7 @@ PYTHON_SCRIPTS_DIR = CURRENT_DIR.parents[1]
 sys.path.append(str(PYTHON_SCRIPTS_DIR))
 
 # Now we can safely import cleaner logic
-from cleaner import run_llm_cleaning_logic
+from cleaner import run_llm_cleaning_logic, run_backfill
 
 
 @task(
@@ -30,9 +30,25 @@ def llm_cleaning_task():
     run_llm_cleaning_logic(logger)
     logger.info("✅ Finished LLM cleaning.")
 
+@task(
+    name="Run LLM Backfill",
+    retries=1,
+    retry_delay_seconds=30,
+    timeout_seconds=14400 # 4 hours; an unfinished day resumes from its journal on the next run
+)
+def llm_backfill_task(days=None, max_days=None):
+    logger = get_run_logger()
+    logger.info("🧹 Starting LLM backfill of uncleaned days...")
+    run_backfill(logger, days=days, max_days=max_days)
+    logger.info("✅ Finished LLM backfill.")
+
 @flow(name="Reddit LLM Cleaning Flow")
 def reddit_llm_flow():
     llm_cleaning_task()
 
+@flow(name="Reddit LLM Backfill Flow")
+def reddit_llm_backfill_flow(days=None, max_days=None):
+    llm_backfill_task(days, max_days)
+
 if __name__ == "__main__":
     reddit_llm_flow()
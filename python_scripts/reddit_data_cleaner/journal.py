@@ -0,0 +1,82 @@
+# This file contains the per-day cleaning journal used to checkpoint and resume the cleaner
+#
+# Every finished batch appends one JSON line per row (post_id, row, result, error, source) and fsyncs, so a task that
+# times out or crashes loses at most the batches still in flight. A resumed attempt skips every post that already
+# has a result or a clean skip in the journal (failed rows get another try), and the final cleaned CSV is
+# assembled from the journal in row order. The journal is removed once the cleaned file has been written.
+# The source says where an outcome came from: "model" (an answer to this post, live or cached), "cascade" (rejected
+# by the small cascade model), "empty" (nothing to send) or "triage" (skipped before the LLM); only "model" outcomes
+# are kept as triage training labels.
+# A line cut off by a crash mid-write is truncated when the journal is opened, so the next append starts on a
+# fresh line instead of being glued onto it.
+
+import json
+import os
+import threading
+from pathlib import Path
+from config import JOURNAL_DIR
+
+
+def journal_path(cleaned_file, journal_dir=JOURNAL_DIR):
+    return Path(journal_dir) / f"{Path(cleaned_file).stem}.jsonl"
+
+
+class CleaningJournal:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._drop_partial_line()
+
+    def _drop_partial_line(self, block_size=65536):
+        # Cuts the file back to just after its last newline
+        if not self.path.exists():
+            return
+        with open(self.path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(0, position - block_size)
+                f.seek(start)
+                newline = f.read(position - start).rfind(b"\n")
+                if newline != -1:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position < end:
+                f.truncate(position)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def load(self):
+        # {post_id: entry}; the last entry per post wins and a half-written final line is ignored
+        entries = {}
+        if not self.path.exists():
+            return entries
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                entries[entry["post_id"]] = entry
+        return entries
+
+    def completed(self):
+        return {post_id for post_id, entry in self.load().items() if entry["error"] is None}
+
+    def append(self, entries):
+        # entries: [(row, post_id, result, error, source)]; called from the cleaning threads
+        lines = "".join(
+            json.dumps({"post_id": post_id, "row": row, "result": result, "error": error, "source": source},
+                       default=str) + "\n"
+            for row, post_id, result, error, source in entries
+        )
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def remove(self):
+        self.path.unlink(missing_ok=True)
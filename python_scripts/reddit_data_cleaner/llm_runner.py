@@ -1,97 +1,587 @@
 # Responsible for model communication and logic tied to prompt creation and LLM parsing.
 
-import json
-from ollama import Client
-from postprocessor import parse_multiline_comments
+import hashlib
+import logging
+import re
+import time
+from postprocessor import (
+    split_multiline_comments, comment_record_strings, format_comments, repair_json, JSONRepairError,
+    is_usable_answer
+)
+from preprocessor import compact_post, count_tokens
+from response_cache import cache_key
+from structured_log import component_logger, payload_sampled
+from config import (
+    OLLAMA_HOSTS, OLLAMA_MODEL, LLM_BATCH_SIZE, LLM_CONTEXT_TOKENS,
+    LLM_KEEP_ALIVE, OLLAMA_READY_TIMEOUT, USE_COMPACTION, USE_STRUCTURED_OUTPUT, STREAM_EARLY_ABORT, NUM_PREDICT,
+    USE_CASCADE, CASCADE_MODEL, CASCADE_AUDIT_RATE
+)
 
-client = Client(host='http://localhost:11434')
+# Timing fields of an Ollama chat response (durations are in nanoseconds)
+REQUEST_STATS = ("prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration", "load_duration")
 
+# Per-request records go to the structured log (see structured_log.py), not to the run's console logger
+request_log = component_logger("llm")
+cascade_log = component_logger("cascade")
+payload_log = component_logger("payload")
 
+_client = None
+_cascade_enabled = USE_CASCADE
+_warmed = False
 
-# System prompt used across all requests
+
+def get_client():
+    # Built on first use instead of at import time, so importing this module never touches Ollama.
+    # One pool over OLLAMA_HOSTS is shared by all cleaning threads; it routes each request to the least busy
+    # healthy endpoint and fails over when one dies (see ollama_pool.py).
+    global _client
+    if _client is None:
+        from ollama_pool import OllamaClientPool
+        _client = OllamaClientPool(OLLAMA_HOSTS)
+    return _client
+
+
+def endpoint_report():
+    # ([per-endpoint stats], failovers) since the process started, or None before the pool exists
+    if _client is None:
+        return None
+    return _client.report(), _client.failovers
+
+
+# System prompt used across all requests. It is sent as its own system message and never formatted, so every
+# request starts with the same bytes and Ollama can reuse the already evaluated prefix.
 SYSTEM_PROMPT = """### SYSTEM TASK ###
-            You are an automotive expert assistant helping extract structured knowledge from car repair discussions for a mechanic-assist chatbot and emergency troubleshooting system.
+You are an automotive expert assistant helping extract structured knowledge from car repair discussions for a mechanic-assist chatbot and emergency troubleshooting system.
+
+Your job is to extract a clear "problem" and the best matching "solution" from real Reddit car-related posts.
+
+Your output will be used to train and fine-tune a support chatbot for a company called Car Clinic.
+
+---
+
+### INSTRUCTIONS ###
+1. Carefully read the post title, self-text, and top comment (The top comments include 1 to 3 comments,where each comment start from starts with the comments user then the score; for example, FriendlySociety3831 (Score: 3): ).
+2. Determine if the post includes a **specific, actionable car problem**.
+3. Determine if the comment provides a **mechanically sound, complete solution**.
+4. If either of these is missing, return:
+```json
+{"is_valid": false, "problem": null, "solution": null}
+```
+5. If both are present, return in the format below:
+```json
+{"is_valid": true, "problem": "...", "solution": "..."}
+```
+6. If is_valid is true, then add suggested general extra help in another row:
+```json
+{"is_valid": true, "problem": "...", "solution": "...", "Extra General Help": "..."}
+```
+7. Output only valid JSON, in the format requested, following the rules above.
+Do NOT include any explanation or extra text. Output only JSON.
+"""
 
-            Your job is to extract a clear "problem" and the best matching "solution" from real Reddit car-related posts.
 
-            Your output will be used to train and fine-tune a support chatbot for a company called Car Clinic.
+# Opens the user message when several posts share one request
+BATCH_INSTRUCTIONS = """### BATCH MODE ###
+This message contains several independent posts, each one introduced by its POST ID.
+Apply the instructions to every post separately. Instead of a single JSON object,
+return one JSON array with exactly one object per post, in the same order, and copy each post's
+id into a "post_id" field, for example:
+```json
+[{"post_id": "abc123", "is_valid": false, "problem": null, "solution": null}]
+```
+Output only the JSON array.
+"""
 
-            ---
+# Part of every response cache key: bump PROMPT_TEMPLATE_VERSION when the user-message layout changes.
+# Edits to the instruction texts change the hash on their own.
+PROMPT_TEMPLATE_VERSION = 2
+PROMPT_VERSION = f"v{PROMPT_TEMPLATE_VERSION}-" + hashlib.sha1(
+    (SYSTEM_PROMPT + BATCH_INSTRUCTIONS).encode("utf-8")
+).hexdigest()[:12]
 
-            ### INSTRUCTIONS ###
-            1. Carefully read the post title, self-text, and top comment (The top comments include 1 to 3 comments,where each comment start from starts with the comments user then the score; for example, FriendlySociety3831 (Score: 3): ).
-            2. Determine if the post includes a **specific, actionable car problem**.
-            3. Determine if the comment provides a **mechanically sound, complete solution**.
-            4. If either of these is missing, return:  
-            ```json
-            {"is_valid": false, "problem": null, "solution": null}
-            ```
-            5. If both are present, return in the format below:
-            ```json
-            {"is_valid": true, "problem": "...", "solution": "..."}
-            ```
-            6. If is_valid is true, then add suggested general extra help in another row:
-            ```json
-            {"is_valid": true, "problem": "...", "solution": "...", "Extra General Help": "..."}
-            ```
-            7. Output only one single valid JSON object following the rules above.
-            Do NOT include any explanation or extra text. Output only JSON.
+# Ollama structured-output schemas. Property order is the generation order, so is_valid comes right after
+# post_id and an invalid verdict is known within a few tokens.
+ANSWER_PROPERTIES = {
+    "is_valid": {"type": "boolean"},
+    "problem": {"type": ["string", "null"]},
+    "solution": {"type": ["string", "null"]},
+    "Extra General Help": {"type": ["string", "null"]},
+}
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": ANSWER_PROPERTIES,
+    "required": ["is_valid", "problem", "solution"],
+}
+BATCH_RESPONSE_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"post_id": {"type": "string"}, **ANSWER_PROPERTIES},
+        "required": ["post_id", "is_valid", "problem", "solution"],
+    },
+}
+INVALID_VERDICT = re.compile(r'"is_valid"\s*:\s*false')
 
-            """
+# Small-model screen of the cascade: one verdict per post, no extraction. Anything but "invalid" is escalated.
+SCREEN_PROMPT = """### SYSTEM TASK ###
+You screen Reddit car-advice posts for a dataset of car problems and their solutions.
+Read the post title, self-text and top comments, then answer with one verdict:
+- "valid": the post has a specific, actionable car problem AND a comment gives a mechanically sound solution
+- "invalid": the problem or the solution is clearly missing
+- "unsure": you cannot tell
+Output only JSON: {"verdict": "valid"}, {"verdict": "invalid"} or {"verdict": "unsure"}
+"""
+SCREEN_SCHEMA = {
+    "type": "object",
+    "properties": {"verdict": {"type": "string", "enum": ["valid", "invalid", "unsure"]}},
+    "required": ["verdict"],
+}
+
+# Tiny request used to load the model and evaluate the system prompt before the cleaning loop
+WARMUP_MESSAGE = "Reply with an empty JSON object."
 
 
 def build_prompt(title, selftext, comments):
-    return f"""{SYSTEM_PROMPT}
-        POST TITLE
-        {title}
+    # User message for one post; the instructions travel separately as the system message
+    return (
+        f"POST TITLE\n{title}\n\n"
+        f"POST BODY\n{selftext}\n\n"
+        f"TOP COMMENTS\n{comments}\n\n"
+        "YOUR RESPONSE (JSON ONLY, NO EXPLANATION)"
+    )
+
+
+def build_post_block(post):
+    return (
+        f"POST ID\n{post['post_id']}\n\n"
+        f"POST TITLE\n{post['title']}\n\n"
+        f"POST BODY\n{post['selftext']}\n\n"
+        f"TOP COMMENTS\n{post['comments']}\n\n"
+    )
+
+
+def build_batch_prompt(posts):
+    blocks = "".join(build_post_block(post) for post in posts)
+    return f"{BATCH_INSTRUCTIONS}\n{blocks}YOUR RESPONSE (JSON ARRAY ONLY, NO EXPLANATION)"
 
-        POST BODY
-        {selftext}
 
-        TOP COMMENTS
-        {comments}
+def estimate_tokens(text):
+    # Counted with the model's tokenizer (or its ~4 chars/token fallback); used to keep batches inside the context
+    return count_tokens(text)
 
-        YOUR RESPONSE (JSON ONLY, NO EXPLANATION)
-        """
 
+def prepare_row(row):
+    # The fields of one post as they go into a prompt, or None for rows with nothing to clean
+    title = row.get("title", "")
+    selftext = row.get("selftext", "")
+    title = title if isinstance(title, str) else ""
+    selftext = selftext if isinstance(selftext, str) else ""
+    if not title.strip() and not selftext.strip():
+        return None
+
+    # Rows from the Parquet store carry structured comments; old CSV rows only have the flattened string
+    comments = row.get("comments")
+    if isinstance(comments, list):
+        comment_strings = comment_record_strings(comments)
+    else:
+        comment_strings = split_multiline_comments(row.get("top_comments", ""))
 
-def call_llm_and_parse(prompt: str, idx: int, logger):
+    post = {"post_id": str(row.get("id", ""))}
+    if USE_COMPACTION:
+        title, selftext, comment_strings, post["tokens_before"], post["tokens_after"] = compact_post(
+            title, selftext, comment_strings
+        )
+    post.update({"title": title, "selftext": selftext, "comments": format_comments(comment_strings)})
+    return post
+
+
+def plan_batches(rows, batch_size=LLM_BATCH_SIZE, context_tokens=LLM_CONTEXT_TOKENS, cache=None):
+    # Groups (idx, row) pairs into batches of (idx, row, post) in row order. A batch closes when it holds
+    # batch_size posts or when one more post (plus its reserved answer) would overflow the context.
+    # Rows with nothing to clean ride along with post=None, and posts answered from the cache ride along
+    # with their cached answer, so both keep their place in the output without taking a slot in the request.
+    fixed_tokens = estimate_tokens(SYSTEM_PROMPT + BATCH_INSTRUCTIONS)
+    batches, batch, batch_posts, batch_tokens = [], [], 0, fixed_tokens
+    for idx, row in rows:
+        post = prepare_row(row)
+        cost = 0
+        if post is not None and cache is not None:
+            post["cache_key"] = cache_key(OLLAMA_MODEL, PROMPT_VERSION, post["title"], post["selftext"], post["comments"])
+            post["cached_answer"] = cache.get(post["cache_key"])
+        if post is not None and post.get("cached_answer") is None:
+            cost = estimate_tokens(build_post_block(post)) + NUM_PREDICT
+            if batch_posts and (batch_posts >= batch_size or batch_tokens + cost > context_tokens):
+                batches.append(batch)
+                batch, batch_posts, batch_tokens = [], 0, fixed_tokens
+            batch_posts += 1
+        batch.append((idx, row, post))
+        batch_tokens += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def chat(user_message, schema=None, expected_answers=0, model=OLLAMA_MODEL, system=SYSTEM_PROMPT, endpoint=None,
+         **options):
+    # Returns (response text, timing stats). Options and keep_alive are the same on every request,
+    # since a different num_ctx would make Ollama reload the model. With expected_answers set the reply is
+    # streamed and cut off once that many "is_valid": false verdicts have arrived (see stream_until_invalid).
+    # stats["wall_ms"] is the request's latency as the cleaner saw it. With an endpoint the request goes to that
+    # pool endpoint only, otherwise the pool picks one.
+    request = dict(
+        model=model,
+        messages=[
+            {"role": "system", "content": system},
+            {"role": "user", "content": user_message}
+        ],
+        options={"num_ctx": LLM_CONTEXT_TOKENS, **options},
+        keep_alive=LLM_KEEP_ALIVE
+    )
+    if schema is not None and USE_STRUCTURED_OUTPUT:
+        request["format"] = schema
+    start = time.perf_counter()
+    if expected_answers and STREAM_EARLY_ABORT:
+        text, stats = stream_until_invalid(request, expected_answers,
+                                           closing="]" if schema is BATCH_RESPONSE_SCHEMA else "")
+    elif endpoint is not None:
+        response = get_client().chat_on(endpoint, **request)
+        stats = {key: response.get(key) or 0 for key in REQUEST_STATS}
+        text = response['message']['content'].strip()
+    else:
+        response = get_client().chat(**request)
+        stats = {key: response.get(key) or 0 for key in REQUEST_STATS}
+        text = response['message']['content'].strip()
+    stats["wall_ms"] = (time.perf_counter() - start) * 1000
+    return text, stats
+
+
+def stream_until_invalid(request, expected_answers, closing=""):
+    # Closing the stream drops the HTTP connection, which makes Ollama stop generating. The text is cut right
+    # after the last verdict and closed with "}" (plus "]" for a batch), so it still parses as the full answer
+    # would: every object invalid, with problem/solution missing.
+    stream = get_client().chat(stream=True, **request)
+    text, chunks, aborted = "", 0, False
+    stats = {key: 0 for key in REQUEST_STATS}
     try:
-        response = client.chat(model="mistral", messages=[{"role": "user", "content": prompt}])
-        response_text = response['message']['content'].strip()
-        logger.info(f"🔁 Raw model response for row {idx}:\n{response_text}")
-        parsed = json.loads(response_text)
-        if parsed.get("is_valid"):
-            parsed.setdefault("Extra General Help", "")
-            return parsed, None
-        return None, None
-    except json.JSONDecodeError as e:
+        for chunk in stream:
+            text += chunk['message']['content']
+            chunks += 1
+            if chunk.get('done'):
+                stats = {key: chunk.get(key) or 0 for key in REQUEST_STATS}
+                break
+            verdicts = list(INVALID_VERDICT.finditer(text))
+            if len(verdicts) >= expected_answers:
+                text = text[:verdicts[-1].end()] + "}" + closing
+                aborted = True
+                break
+    finally:
+        stream.close()
+    if aborted:
+        stats["eval_count"] = chunks  # one streamed chunk per generated token
+    stats["aborted"] = aborted
+    return text.strip(), stats
+
+
+def record_stats(stats, counters, rows, model=OLLAMA_MODEL):
+    # Ollama only reports the prompt tokens it actually evaluated, so a reused system-prompt prefix shows up
+    # here as a smaller prompt_eval count and time. A stream closed early never gets the final chunk with the
+    # timings, so prompt eval and generation times only cover the completed requests.
+    aborted = bool(stats.get("aborted"))
+    counters["eval_tokens"] += stats["eval_count"]
+    counters["early_aborts"] += aborted
+    counters["request_ms"] += stats.get("wall_ms", 0)
+    if not aborted:
+        counters["completed_requests"] += 1
+        counters["prompt_eval_tokens"] += stats["prompt_eval_count"]
+        counters["prompt_eval_ms"] += stats["prompt_eval_duration"] / 1e6
+        counters["eval_ms"] += stats["eval_duration"] / 1e6
+    request_log.info("request", extra={"fields": {
+        "rows": rows, "model": model, "wall_ms": round(stats.get("wall_ms", 0), 1),
+        "prompt_eval_tokens": None if aborted else stats["prompt_eval_count"],
+        "prompt_eval_ms": None if aborted else round(stats["prompt_eval_duration"] / 1e6, 1),
+        "eval_tokens": stats["eval_count"], "eval_ms": None if aborted else round(stats["eval_duration"] / 1e6, 1),
+        "aborted": aborted,
+    }})
+
+
+def log_payload(rows, prompt, response_text, error=None):
+    # Full prompt and answer, for failed requests and a sampled share of the rest
+    if error is None and not payload_sampled(prompt):
+        return
+    payload_log.log(logging.WARNING if error else logging.INFO, "payload", extra={"fields": {
+        "rows": rows, "error": error, "prompt": prompt, "response": response_text
+    }})
+
+
+def new_counters():
+    return {key: 0 for key in (
+        "llm_requests", "batched_posts", "single_post_retries", "cache_hits", "cache_misses",
+        "completed_requests", "prompt_eval_tokens", "prompt_eval_ms", "eval_tokens", "eval_ms", "early_aborts",
+        "repaired_responses", "unrecoverable_responses", "request_ms",
+        "screen_requests", "screen_ms", "screened_valid", "screened_invalid", "screened_unsure", "cascade_rejected",
+        "audited", "audit_decided", "audit_agreed", "audit_rejected", "audit_rejected_confirmed"
+    )}
+
+
+def wait_until_ready(logger, timeout=OLLAMA_READY_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            get_client().list()
+            return
+        except Exception as e:
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"Ollama at {', '.join(OLLAMA_HOSTS)} not ready after {timeout}s: {e}") from e
+            logger.info("⏳ Waiting for Ollama to accept requests...")
+            time.sleep(1)
+
+
+def warm_up_model(logger):
+    # Loads the model(s) (kept resident for LLM_KEEP_ALIVE) on every live endpoint and evaluates each system
+    # prompt once, so the first real rows don't pay for either. A cascade whose small model cannot be loaded
+    # anywhere is switched off for the run and every post goes straight to the large model. Runs once per
+    # process, so a backfill over many days pays for it only on the first day.
+    global _cascade_enabled, _warmed
+    if _warmed:
+        return
+    wait_until_ready(logger)
+    tiers = [(OLLAMA_MODEL, SYSTEM_PROMPT)]
+    if _cascade_enabled:
+        tiers.append((CASCADE_MODEL, SCREEN_PROMPT))
+    for model, system in tiers:
+        warm_on, error = 0, None
+        for endpoint in get_client().healthy_endpoints():
+            start = time.time()
+            try:
+                _, stats = chat(WARMUP_MESSAGE, model=model, system=system, endpoint=endpoint, num_predict=1)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not warm {model} on {endpoint.host}: {e}")
+                error = e
+                continue
+            warm_on += 1
+            logger.info(
+                f"🔥 {model} warm on {endpoint.host} in {time.time() - start:.1f}s "
+                f"(load {stats['load_duration'] / 1e6:.0f} ms, system prompt {stats['prompt_eval_count']} tokens "
+                f"in {stats['prompt_eval_duration'] / 1e6:.0f} ms), keep_alive={LLM_KEEP_ALIVE}"
+            )
+        if warm_on:
+            continue
+        if model != CASCADE_MODEL:
+            raise RuntimeError(f"{model} could not be loaded on any Ollama endpoint: {error}")
+        logger.warning(f"⚠️ Cascade model {CASCADE_MODEL} unavailable, sending every post to {OLLAMA_MODEL}: {error}")
+        _cascade_enabled = False
+    _warmed = True
+
+
+def to_result(parsed):
+    if parsed.get("is_valid"):
+        parsed.setdefault("Extra General Help", "")
+        return parsed
+    return None
+
+
+def parse_answer(response_text, counters):
+    # Repairs the answer if needed and counts each fix (repair_fenced, repair_truncated, ...) in counters
+    parsed, fixes = repair_json(response_text)
+    for fix in fixes:
+        counters[f"repair_{fix}"] = counters.get(f"repair_{fix}", 0) + 1
+    counters["repaired_responses"] += bool(fixes)
+    return parsed
+
+
+def call_llm_and_parse(prompt: str, idx: int, logger, counters=None):
+    counters = counters if counters is not None else new_counters()
+    response_text = None
+    try:
+        response_text, stats = chat(prompt, RESPONSE_SCHEMA, expected_answers=1, num_predict=NUM_PREDICT)
+        record_stats(stats, counters, [idx])
+        parsed = parse_answer(response_text, counters)
+        if isinstance(parsed, list) and len(parsed) == 1:
+            parsed = parsed[0]
+        if not isinstance(parsed, dict):
+            raise JSONRepairError(f"expected a JSON object, got {type(parsed).__name__}")
+        if not is_usable_answer(parsed):
+            raise JSONRepairError("neither an invalid verdict nor a valid answer with a problem and a solution")
+        log_payload([idx], prompt, response_text)
+        return to_result(parsed), None
+    except JSONRepairError as e:
         logger.error(f"⚠️ JSON parsing failed at row {idx}: {e}")
-        return None, {"row": idx, "error": "JSONDecodeError", "text": response_text}
+        log_payload([idx], prompt, response_text, str(e))
+        counters["unrecoverable_responses"] += 1
+        return None, {"row": idx, "error": "JSONDecodeError", "detail": str(e), "text": response_text}
     except Exception as e:
         logger.error(f"❌ Unexpected error at row {idx}: {e}")
+        log_payload([idx], prompt, response_text, str(e))
         return None, {"row": idx, "error": str(e), "prompt": prompt}
 
 
-def clean_single_row(row, idx, logger):
-    post_id = row.get("id", "")
-    title = row.get("title", "")
-    selftext = row.get("selftext", "")
-    raw_comments = row.get("top_comments", "")
+def clean_post(post, idx, logger, counters=None):
+    prompt = build_prompt(post["title"], post["selftext"], post["comments"])
+    result, error = call_llm_and_parse(prompt, idx, logger, counters)
 
-    if not title.strip() and not selftext.strip():
-        return None, None
+    if result:
+        result["post_id"] = post["post_id"]
 
-    formatted_comments = parse_multiline_comments(raw_comments)
-    prompt = build_prompt(title, selftext, formatted_comments)
-    logger.info(f"\n\n🔍 [Row {idx}] Prompt:\n{'=' * 40}\n{prompt}\n{'=' * 40}\n")
+    return result, error
 
-    result, error = call_llm_and_parse(prompt, idx, logger)
 
+def clean_single_row(row, idx, logger, counters=None):
+    post = prepare_row(row)
+    if post is None:
+        return None, None
+    return clean_post(post, idx, logger, counters)
+
+
+def answer_outcome(answer, post):
+    result = to_result(dict(answer))
     if result:
-        result["post_id"] = post_id
+        result["post_id"] = post["post_id"]
+    return result, None
 
-    return result, error
+
+def in_audit_sample(post_id, rate=CASCADE_AUDIT_RATE):
+    # Deterministic held-out sample: the same posts are audited on every run and retry
+    return int(hashlib.sha1(post_id.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF < rate
+
+
+def screen_post(post, idx, logger, counters):
+    # The small model's verdict for one post; a failed or unparseable screen counts as "unsure"
+    counters["screen_requests"] += 1
+    wall_ms = 0
+    try:
+        response_text, stats = chat(build_prompt(post["title"], post["selftext"], post["comments"]), SCREEN_SCHEMA,
+                                    model=CASCADE_MODEL, system=SCREEN_PROMPT, num_predict=16)
+        wall_ms = stats.get("wall_ms", 0)
+        counters["screen_ms"] += wall_ms
+        parsed, _ = repair_json(response_text)
+        verdict = parsed.get("verdict") if isinstance(parsed, dict) else None
+    except Exception as e:
+        logger.warning(f"⚠️ Screening failed at row {idx}, escalating: {e}")
+        verdict = None
+    verdict = verdict if verdict in ("valid", "invalid", "unsure") else "unsure"
+    cascade_log.info("screen", extra={"fields": {
+        "row": idx, "post_id": post["post_id"], "model": CASCADE_MODEL, "verdict": verdict, "wall_ms": round(wall_ms, 1)
+    }})
+    return verdict
+
+
+def screen_posts(posts, outcomes, logger, counters):
+    # Small tier of the cascade. Returns the (idx, post) pairs to escalate; posts the small model rejects get an
+    # invalid outcome right away (and are marked cascade_rejected), unless they are in the audit sample, which always
+    # reaches the large model
+    escalated = []
+    for idx, post in posts:
+        verdict = screen_post(post, idx, logger, counters)
+        counters[f"screened_{verdict}"] += 1
+        if in_audit_sample(post["post_id"]):
+            post["audit_verdict"] = verdict
+            escalated.append((idx, post))
+        elif verdict == "invalid":
+            counters["cascade_rejected"] += 1
+            post["cascade_rejected"] = True
+            outcomes[idx] = (None, None)
+        else:
+            escalated.append((idx, post))
+    return escalated
+
+
+def record_agreement(post, outcome, counters):
+    # Compares an audited post's small-model verdict with the large model's answer
+    verdict = post.get("audit_verdict")
+    result, error = outcome
+    if verdict is None or error is not None:
+        return
+    counters["audited"] += 1
+    if verdict == "unsure":
+        return
+    large_verdict = "valid" if result else "invalid"
+    counters["audit_decided"] += 1
+    counters["audit_agreed"] += verdict == large_verdict
+    if verdict == "invalid":
+        counters["audit_rejected"] += 1
+        counters["audit_rejected_confirmed"] += large_verdict == "invalid"
+
+
+def remember(cache, post, outcome):
+    # Store a fresh answer (valid or not) under the post's content key; failures are never cached
+    result, error = outcome
+    if cache is None or error is not None or "cache_key" not in post:
+        return
+    answer = {key: value for key, value in result.items() if key != "post_id"} if result else {"is_valid": False}
+    cache.put(post["cache_key"], OLLAMA_MODEL, PROMPT_VERSION, answer)
+
+
+def parse_batch_response(response_text, counters):
+    # {post_id: answer object} for every usable answer in the model's (repaired) array (see is_usable_answer)
+    parsed = parse_answer(response_text, counters)
+    if isinstance(parsed, dict):
+        parsed = [parsed]
+    answers = {}
+    for item in parsed if isinstance(parsed, list) else []:
+        if isinstance(item, dict) and "post_id" in item and is_usable_answer(item):
+            answers[str(item["post_id"])] = item
+    return answers
+
+
+def clean_batch(batch, logger, cache=None):
+    # Returns ([(result, error) per batch item, in order], counters). Posts whose answer is missing or
+    # malformed in the batch response are retried one by one with the single-post prompt.
+    counters = new_counters()
+    outcomes = {}
+    posts = []
+    for idx, _, post in batch:
+        if post is None:
+            outcomes[idx] = (None, None)
+        elif post.get("cached_answer") is not None:
+            counters["cache_hits"] += 1
+            outcomes[idx] = answer_outcome(post["cached_answer"], post)
+        else:
+            posts.append((idx, post))
+    if cache is not None:
+        counters["cache_misses"] += len(posts)
+    if _cascade_enabled and posts:
+        posts = screen_posts(posts, outcomes, logger, counters)
+
+    if len(posts) == 1:
+        idx, post = posts[0]
+        counters["llm_requests"] += 1
+        outcomes[idx] = clean_post(post, idx, logger, counters)
+        remember(cache, post, outcomes[idx])
+        record_agreement(post, outcomes[idx], counters)
+    elif posts:
+        row_ids = [idx for idx, _ in posts]
+        prompt = build_batch_prompt([post for _, post in posts])
+        answers = {}
+        response_text = None
+        counters["llm_requests"] += 1
+        try:
+            response_text, stats = chat(prompt, BATCH_RESPONSE_SCHEMA, expected_answers=len(posts),
+                                        num_predict=NUM_PREDICT * len(posts))
+            record_stats(stats, counters, row_ids)
+            answers = parse_batch_response(response_text, counters)
+            missing = [idx for idx, post in posts if post["post_id"] not in answers]
+            log_payload(row_ids, prompt, response_text, f"no usable answer for rows {missing}" if missing else None)
+        except JSONRepairError as e:
+            logger.warning(f"⚠️ Batch JSON parsing failed for rows {row_ids}: {e}")
+            log_payload(row_ids, prompt, response_text, str(e))
+        except Exception as e:
+            logger.error(f"❌ Unexpected error for batch rows {row_ids}: {e}")
+            log_payload(row_ids, prompt, response_text, str(e))
+
+        for idx, post in posts:
+            answer = answers.get(post["post_id"])
+            if answer is None:
+                logger.warning(f"↩️ No usable batch answer for row {idx}, retrying it on its own")
+                counters["llm_requests"] += 1
+                counters["single_post_retries"] += 1
+                outcomes[idx] = clean_post(post, idx, logger, counters)
+            else:
+                counters["batched_posts"] += 1
+                outcomes[idx] = answer_outcome(answer, post)
+            remember(cache, post, outcomes[idx])
+            record_agreement(post, outcomes[idx], counters)
+
+    return [outcomes[idx] for idx, _, _ in batch], counters
 
 
 # DONEEEEEEEEE
\ No newline at end of file
@@ -0,0 +1,216 @@
+# This file contains the client pool that spreads cleaning requests over several Ollama endpoints
+#
+# OLLAMA_HOSTS lists the endpoints (several `ollama serve` processes pinned to different cores, spare LAN machines, ...).
+# Each request goes to the healthy endpoint with the fewest requests in flight. An endpoint that refuses connections
+# or drops them is marked down and the request fails over to the next one; a down endpoint is probed again (a cheap
+# /api/tags call) once OLLAMA_HEALTH_CHECK_SECONDS have passed. A 5xx answer (e.g. a full server queue) fails over
+# too but leaves the endpoint up. Per-endpoint request counts, failures and latencies are kept for the run summary.
+#
+# The pool has the same chat()/list() surface as ollama.Client, so llm_runner uses it in place of a single client.
+# Streamed chats keep their endpoint busy until the stream is closed or exhausted.
+
+import threading
+import time
+from collections import deque
+import httpx
+from config import OLLAMA_HOSTS, OLLAMA_HEALTH_CHECK_SECONDS
+from structured_log import component_logger
+
+logger = component_logger("pool")
+
+LATENCY_WINDOW = 1000  # latencies kept per endpoint for the percentiles
+
+
+class NoHealthyEndpoint(RuntimeError):
+    pass
+
+
+def failure_kind(error):
+    # "down" for a dead or unreachable endpoint, "busy" for an error worth retrying elsewhere (a server-side
+    # error, or a model that is not pulled on this endpoint), None for errors that would fail anywhere
+    from ollama import ResponseError
+    if isinstance(error, (ConnectionError, httpx.TransportError)):
+        return "down"
+    if isinstance(error, ResponseError) and (error.status_code >= 500 or error.status_code == 404):
+        return "busy"
+    return None
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Endpoint:
+    def __init__(self, host, client):
+        self.host = host
+        self.client = client
+        self.healthy = True
+        self.next_check = 0.0
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def report(self):
+        latencies = list(self.latencies)
+        return {
+            "host": self.host,
+            "healthy": self.healthy,
+            "requests": self.requests,
+            "failures": self.failures,
+            "avg_ms": sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50_ms": percentile(latencies, 0.5),
+            "p95_ms": percentile(latencies, 0.95),
+        }
+
+
+class PooledStream:
+    # Iterates a streamed chat; the endpoint counts as busy until close() or the last chunk
+    def __init__(self, pool, endpoint, iterator, first, start):
+        self.pool, self.endpoint, self.iterator, self.first, self.start = pool, endpoint, iterator, first, start
+        self._released = False
+
+    def __iter__(self):
+        try:
+            if self.first is not None:
+                yield self.first
+            yield from self.iterator
+        except Exception as e:
+            if failure_kind(e) == "down":
+                self.pool.mark_down(self.endpoint, e)
+            raise
+        finally:
+            self.close()
+
+    def close(self):
+        if self._released:
+            return
+        self._released = True
+        close = getattr(self.iterator, "close", None)
+        if close is not None:
+            close()
+        self.pool.release(self.endpoint, (time.perf_counter() - self.start) * 1000)
+
+
+class OllamaClientPool:
+    def __init__(self, hosts=OLLAMA_HOSTS, client_factory=None, health_check_seconds=OLLAMA_HEALTH_CHECK_SECONDS):
+        if not hosts:
+            raise ValueError("OllamaClientPool needs at least one host")
+        if client_factory is None:
+            from ollama import Client
+            client_factory = lambda host: Client(host=host)
+        self.endpoints = [Endpoint(host, client_factory(host)) for host in hosts]
+        self.health_check_seconds = health_check_seconds
+        self.failovers = 0
+        self._lock = threading.Lock()
+
+    # ----- routing -----
+    def _pick(self, tried):
+        # Least outstanding requests among endpoints that are up or due for a health check
+        now = time.monotonic()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e.host not in tried and (e.healthy or now >= e.next_check)]
+            if not candidates:
+                return None
+            endpoint = min(candidates, key=lambda e: (not e.healthy, e.outstanding, e.requests))
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def _acquire(self, tried):
+        while True:
+            endpoint = self._pick(tried)
+            if endpoint is None or endpoint.healthy or self.check(endpoint):
+                return endpoint
+            self.release(endpoint)
+            tried.add(endpoint.host)
+
+    def release(self, endpoint, latency_ms=None):
+        with self._lock:
+            endpoint.outstanding -= 1
+            if latency_ms is not None:
+                endpoint.latencies.append(latency_ms)
+
+    # ----- health -----
+    def mark_down(self, endpoint, error):
+        with self._lock:
+            was_healthy = endpoint.healthy
+            endpoint.healthy = False
+            endpoint.failures += 1
+            endpoint.next_check = time.monotonic() + self.health_check_seconds
+        if was_healthy:
+            logger.warning(f"⚠️ Ollama endpoint {endpoint.host} is down ({error}); "
+                           f"checking it again in {self.health_check_seconds:.0f}s")
+
+    def check(self, endpoint):
+        try:
+            endpoint.client.list()
+        except Exception as e:
+            self.mark_down(endpoint, e)
+            return False
+        with self._lock:
+            was_healthy = endpoint.healthy
+            endpoint.healthy = True
+        if not was_healthy:
+            logger.info(f"✅ Ollama endpoint {endpoint.host} is back")
+        return True
+
+    def healthy_endpoints(self):
+        return [endpoint for endpoint in self.endpoints if endpoint.healthy]
+
+    def list(self):
+        # Health-checks every endpoint; the model list of the first live one, like Client.list()
+        live = [endpoint for endpoint in self.endpoints if self.check(endpoint)]
+        if not live:
+            raise NoHealthyEndpoint(f"no Ollama endpoint is reachable: {', '.join(e.host for e in self.endpoints)}")
+        return live[0].client.list()
+
+    # ----- requests -----
+    def chat(self, stream=False, **request):
+        tried = set()
+        while True:
+            endpoint = self._acquire(tried)
+            if endpoint is None:
+                raise NoHealthyEndpoint(f"no healthy Ollama endpoint left (tried {', '.join(sorted(tried)) or 'none'})")
+            try:
+                return self._send(endpoint, stream, request)
+            except Exception as e:
+                kind = failure_kind(e)
+                if kind is None:
+                    raise
+                if kind == "down":
+                    self.mark_down(endpoint, e)
+                tried.add(endpoint.host)
+                with self._lock:
+                    self.failovers += 1
+                logger.warning(f"🔀 Request failed on {endpoint.host} ({e}), trying another endpoint")
+
+    def chat_on(self, endpoint, **request):
+        # One request on a given endpoint, without failover (used to warm up every endpoint)
+        with self._lock:
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+        return self._send(endpoint, False, request)
+
+    def _send(self, endpoint, stream, request):
+        start = time.perf_counter()
+        try:
+            if not stream:
+                response = endpoint.client.chat(**request)
+                self.release(endpoint, (time.perf_counter() - start) * 1000)
+                return response
+            # Ollama's streaming client connects lazily, so the first chunk is fetched here, where a dead endpoint
+            # can still fail over without any output having been consumed
+            iterator = iter(endpoint.client.chat(stream=True, **request))
+            first = next(iterator, None)
+        except Exception:
+            self.release(endpoint)
+            raise
+        return PooledStream(self, endpoint, iterator, first, start)
+
+    def report(self):
+        with self._lock:
+            return [endpoint.report() for endpoint in self.endpoints]
@@ -8,14 +8,14 @@
 import re
 import json
 
-def parse_multiline_comments(raw_comment_block: str) -> str:
+def split_multiline_comments(raw_comment_block: str) -> list:
     # Regex to detect start of a comment line: username (Score: number):
-    comment_start_pattern = re.compile(r'^\S+ \(Score: \d+\):')
+    comment_start_pattern = re.compile(r'^\S+ \(Score: -?\d+\):')
 
     comments = []
     current_comment_lines = []
 
-    for line in raw_comment_block.splitlines():
+    for line in str(raw_comment_block or "").splitlines():
         if comment_start_pattern.match(line):
             # If we have collected lines for a previous comment, save it
             if current_comment_lines:
@@ -29,8 +29,222 @@ def parse_multiline_comments(raw_comment_block: str) -> str:
     # Append last comment
     if current_comment_lines:
         comments.append('\n'.join(current_comment_lines).strip())
+    return comments
+
+
+def comment_record_strings(comments: list) -> list:
+    # The same "author (Score: n): body" strings, built straight from structured comment records
+    return [f"{c['comment_author']} (Score: {c['comment_score']}): {c['comment_body']}".strip() for c in comments]
+
 
-    # Format into JSON list with numbered keys
+def format_comments(comments: list) -> str:
+    # JSON list with numbered keys, written compactly (no indentation, non-ASCII kept as is) to save prompt tokens
     formatted = [{f"Comment {i+1}": comment} for i, comment in enumerate(comments)]
-    return "\n" + json.dumps(formatted, indent=2)
+    return json.dumps(formatted, ensure_ascii=False)
+
+
+def parse_multiline_comments(raw_comment_block: str) -> str:
+    return format_comments(split_multiline_comments(raw_comment_block))
+
+
+def format_comment_records(comments: list) -> str:
+    return format_comments(comment_record_strings(comments))
+
+
+# ---------- JSON REPAIR ----------
+# Salvages the usual ways a model answer fails json.loads. Each fix that was needed is reported by name so the
+# cleaner can count them: fenced, extra_prose, python_literals, single_quotes, trailing_comma, truncated.
+# A cut-off answer is only kept as an "is_valid": false verdict: a half-written problem or solution, or a verdict
+# that never finished ("is_valid": tr), is unrecoverable and goes to the retry pass instead.
+FENCED_BLOCK = re.compile(r'```(?:json|JSON)?\s*(.*?)(?:```|$)', re.DOTALL)
+TRAILING_COMMA = re.compile(r',\s*([}\]])')
+PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+PARTIAL_LITERAL = re.compile(r'[:,\[]\s*(t|tr|tru|f|fa|fal|fals|n|nu|nul)$')
+ANSWER_FIELDS = ("problem", "solution")
+
+
+class JSONRepairError(ValueError):
+    pass
+
+
+def _outside_strings(text, replace):
+    # Applies replace(segment) to every part of text that is not inside a double-quoted JSON string
+    out, segment, in_string, escaped = [], [], False, False
+    for char in text:
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            out.append(replace(''.join(segment)))
+            segment = []
+            out.append(char)
+            in_string = True
+        else:
+            segment.append(char)
+    out.append(replace(''.join(segment)))
+    return ''.join(out)
+
+
+def _json_span(text):
+    # From the first { or [ to its matching bracket (or to the end of the text if it never closes)
+    starts = [i for i in (text.find('{'), text.find('[')) if i != -1]
+    if not starts:
+        return None
+    start = min(starts)
+    depth, in_string, escaped = 0, False, False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            depth += 1
+        elif char in '}]':
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return text[start:]
+
+
+def _single_to_double_quotes(text):
+    # 'key': 'value' -> "key": "value"; double quotes inside a single-quoted string get escaped
+    out, quote, escaped = [], None, False
+    for char in text:
+        if quote is None:
+            if char in '"\'':
+                quote = char
+                out.append('"')
+            else:
+                out.append(char)
+        elif escaped:
+            out.append("'" if (quote == "'" and char == "'") else '\\' + char)
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == quote:
+            quote = None
+            out.append('"')
+        elif char == '"':
+            out.append('\\"')
+        else:
+            out.append(char)
+    return ''.join(out)
+
+
+def _close_truncated(text):
+    # Closes an open string, drops a dangling comma / key, and closes every open bracket in order
+    stack, in_string, escaped = [], False, False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]' and stack:
+            stack.pop()
+    if not stack and not in_string:
+        return text
+    if in_string:
+        text += '"'
+    text = text.rstrip()
+    partial = PARTIAL_LITERAL.search(text)
+    if partial:
+        text = text[:partial.start(1)].rstrip()  # never guess the rest of a literal: the value counts as missing
+    if text.endswith(','):
+        text = text[:-1]
+    elif text.endswith(':'):
+        text += ' null'
+    elif stack and stack[-1] == '}' and re.search(r'[{,]\s*"(?:[^"\\]|\\.)*"$', text):
+        text += ': null'  # a key whose value never arrived
+    return text + ''.join(reversed(stack))
+
+
+def is_usable_answer(answer):
+    # An explicit invalid verdict, or a valid one that carries both a problem and a solution
+    if not isinstance(answer, dict):
+        return False
+    if answer.get("is_valid") is False:
+        return True
+    return answer.get("is_valid") is True and all(
+        isinstance(answer.get(field), str) and answer[field].strip() for field in ANSWER_FIELDS
+    )
+
+
+def _keep_truncated(parsed):
+    # Only the last object of a cut-off answer was cut; it is kept only if it is an invalid verdict
+    if isinstance(parsed, list):
+        if parsed and not (isinstance(parsed[-1], dict) and parsed[-1].get("is_valid") is False):
+            parsed = parsed[:-1]  # that post's answer is missing, so it is retried on its own
+        return parsed
+    if isinstance(parsed, dict) and parsed.get("is_valid") is False:
+        return parsed
+    raise JSONRepairError("truncated answer without an invalid verdict")
+
+
+def repair_json(text):
+    """Parse a model answer, repairing it if needed. Returns (parsed, [fixes applied])."""
+    if text is None:
+        raise JSONRepairError("empty response")
+    text = text.strip()
+    try:
+        return json.loads(text), []
+    except json.JSONDecodeError:
+        pass
+
+    fixes = []
+    candidate = text
+    fenced = FENCED_BLOCK.search(candidate)
+    if fenced and fenced.group(1).strip():
+        candidate = fenced.group(1).strip()
+        fixes.append("fenced")
+
+    span = _json_span(candidate)
+    if span is None:
+        raise JSONRepairError("no JSON object or array in response")
+    if span.strip() != candidate.strip():
+        fixes.append("extra_prose")
+    candidate = span
+
+    steps = [
+        ("python_literals", lambda t: _outside_strings(
+            t, lambda seg: re.sub(r'\b(True|False|None)\b', lambda m: PYTHON_LITERALS[m.group(1)], seg))),
+        ("single_quotes", lambda t: _single_to_double_quotes(t) if "'" in t else t),
+        ("truncated", _close_truncated),
+        ("trailing_comma", lambda t: _outside_strings(t, lambda seg: TRAILING_COMMA.sub(r'\1', seg))),
+    ]
+    for name, step in steps:
+        try:
+            parsed = json.loads(candidate)
+            break
+        except json.JSONDecodeError:
+            pass
+        repaired = step(candidate)
+        if repaired != candidate:
+            candidate = repaired
+            fixes.append(name)
+    else:
+        try:
+            parsed = json.loads(candidate)
+        except json.JSONDecodeError as e:
+            raise JSONRepairError(f"unrecoverable after {fixes or 'no fixes'}: {e}") from e
 
+    if "truncated" in fixes:
+        parsed = _keep_truncated(parsed)
+    return parsed, fixes
@@ -1,12 +1,509 @@
 # If you later want to trim/normalize raw inputs (titles, selftext, etc.)
+#
+# Also home of the pre-LLM triage stage: a small multinomial Naive Bayes text classifier, trained on the verdicts
+# the LLM gave on earlier days, that predicts whether a post can yield a valid problem/solution pair. Posts whose
+# predicted P(valid) falls below the calibrated threshold are skipped before any prompt is built, but only once the
+# model's cross-validated AUC shows it actually separates the classes (see TRIAGE_MIN_AUC in config.py).
+#
+# The compaction stage (compact_text / compact_post) shrinks prompts: it strips markdown, URLs, quoted replies and
+# sign-offs, and cuts title, body and every comment to a token budget measured with the model's tokenizer.
+#
+# Train / evaluate (from python_scripts/reddit_data_cleaner):
+#   python preprocessor.py            -> day-grouped cross-validation report, then trains and saves the model
+
+import html
+import json
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from config import (
+    DATA_DIR, TRIAGE_MODEL_FILE, TRIAGE_THRESHOLD, TRIAGE_TARGET_RECALL, TRIAGE_MIN_AUC, TRIAGE_LABELS_DIR,
+    TRIAGE_LEGACY_LAST_DAY, TRIAGE_LEGACY_ROWS_PER_DAY,
+    TOKENIZER_NAME, TITLE_TOKEN_BUDGET, SELFTEXT_TOKEN_BUDGET, COMMENT_TOKEN_BUDGET
+)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+MARKDOWN_LINK = re.compile(r'!?\[([^\]]*)\]\((?:[^()]|\([^)]*\))*\)')
+URL = re.compile(r'(?:https?://|www\.)\S+')
+QUOTED_LINE = re.compile(r'^\s*>.*$', re.MULTILINE)
+HEADER_OR_RULE = re.compile(r'^\s*(?:#{1,6}\s*|[-*_]{3,}\s*$)', re.MULTILINE)
+EMPHASIS = re.compile(r'(\*\*|~~|`+)')
+# __bold text__ only when it wraps several words, so identifiers like __init__ or MAX__RPM keep their underscores
+UNDERSCORE_EMPHASIS = re.compile(r'(?<!\w)__(?=\S)([^_\n]*?\s[^_\n]*?)(?<=\S)__(?!\w)')
+ZERO_WIDTH = re.compile(r'[\u200b\u200c\u200d\ufeff]')
+REPEATED_PUNCTUATION = re.compile(r'([!?])\1{2,}')
+LONG_ELLIPSIS = re.compile(r'\.{4,}')  # an ellipsis ("...") is kept as it is
+SPACES = re.compile(r'[ \t\u00a0]+')
+BLANK_LINES = re.compile(r'\n\s*\n+')
+# Trailing sign-offs that carry no information for the model
+SIGN_OFF = re.compile(
+    r'(?:\n|^)\s*(?:thanks?(?: you)?(?: (?:so much|in advance|all|guys|everyone))?|tia|cheers|any help (?:is )?'
+    r'(?:appreciated|would be appreciated)|sent from my \w+(?: \w+)?|edit: (?:thanks|formatting|typo)s?\b.*)[.!\s]*$',
+    re.IGNORECASE
+)
 
 
 def normalize_text(text: str) -> str:
-    # Complete this part later, Not important to the MVP
     """
-    Placeholder for future pre-cleaning steps:
+    Pre-cleaning steps for one field of a post:
     - Trim whitespace
     - Remove markdown artifacts
     - Fix encoding issues
     """
-    return text.strip()
\ No newline at end of file
+    text = html.unescape(str(text or ""))
+    text = ZERO_WIDTH.sub("", text)
+    text = QUOTED_LINE.sub("", text)  # quoted replies repeat text the model already sees
+    text = MARKDOWN_LINK.sub(lambda match: match.group(1), text)
+    text = URL.sub("[link]", text)
+    text = HEADER_OR_RULE.sub("", text)
+    text = UNDERSCORE_EMPHASIS.sub(r"\1", text)
+    text = EMPHASIS.sub("", text)
+    text = REPEATED_PUNCTUATION.sub(r"\1", text)
+    text = LONG_ELLIPSIS.sub("...", text)
+    text = SPACES.sub(" ", text)
+    text = "\n".join(line.strip() for line in text.splitlines())
+    text = BLANK_LINES.sub("\n", text)
+    previous = None
+    while previous != text:
+        previous, text = text, SIGN_OFF.sub("", text).rstrip()
+    return text.strip()
+
+
+# ---------- TOKEN BUDGET ----------
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+
+class HeuristicTokenizer:
+    # Stand-in when the real tokenizer can't be loaded: ~4 characters per token, cut at a word boundary
+    name = "heuristic (4 chars/token)"
+
+    def count(self, text):
+        return len(text) // 4 + 1 if text else 0
+
+    def truncate(self, text, budget):
+        limit = budget * 4
+        if len(text) <= limit:
+            return text
+        cut = text[:limit]
+        return cut[:cut.rfind(" ")] if " " in cut else cut
+
+
+class HFTokenizer:
+    def __init__(self, name):
+        from transformers import AutoTokenizer
+        self.name = name
+        self.tokenizer = AutoTokenizer.from_pretrained(name)
+
+    def count(self, text):
+        return len(self.tokenizer.encode(text, add_special_tokens=False)) if text else 0
+
+    def truncate(self, text, budget):
+        ids = self.tokenizer.encode(text, add_special_tokens=False)
+        if len(ids) <= budget:
+            return text
+        return self.tokenizer.decode(ids[:budget]).strip()
+
+
+def get_tokenizer():
+    # Loaded once on first use; transformers and the tokenizer files are only touched when compaction runs
+    global _tokenizer
+    with _tokenizer_lock:
+        if _tokenizer is None:
+            try:
+                _tokenizer = HFTokenizer(TOKENIZER_NAME)
+            except Exception as e:
+                logging.getLogger(__name__).warning(
+                    f"⚠️ Tokenizer {TOKENIZER_NAME} unavailable ({e}); counting tokens with a heuristic"
+                )
+                _tokenizer = HeuristicTokenizer()
+    return _tokenizer
+
+
+def tokenizer_in_use():
+    # Name of the tokenizer the counts came from, or None when nothing has been counted yet
+    return None if _tokenizer is None else _tokenizer.name
+
+
+def count_tokens(text):
+    return get_tokenizer().count(text)
+
+
+def compact_text(text, budget):
+    # Normalized text cut to at most `budget` tokens; an ellipsis marks the cut
+    text = normalize_text(text)
+    tokenizer = get_tokenizer()
+    if tokenizer.count(text) <= budget:
+        return text
+    return tokenizer.truncate(text, budget) + " …"
+
+
+def compact_post(title, selftext, comments):
+    # Returns (title, selftext, [comment strings], tokens_before, tokens_after)
+    compacted = (
+        compact_text(title, TITLE_TOKEN_BUDGET),
+        compact_text(selftext, SELFTEXT_TOKEN_BUDGET),
+        [compact_text(comment, COMMENT_TOKEN_BUDGET) for comment in comments],
+    )
+    tokens_before = count_tokens(str(title or "")) + count_tokens(str(selftext or "")) + sum(map(count_tokens, comments))
+    tokens_after = count_tokens(compacted[0]) + count_tokens(compacted[1]) + sum(map(count_tokens, compacted[2]))
+    return (*compacted, tokens_before, tokens_after)
+
+
+# ---------- FEATURES ----------
+def _bucket(value, edges):
+    for edge in edges:
+        if value <= edge:
+            return edge
+    return "more"
+
+
+def comment_records(row):
+    # Comment records of a row: a Parquet row carries them already, an old CSV row has them parsed out of its
+    # top_comments string, so training and triage see the same comment bodies whichever store a day came from
+    comments = row.get("comments")
+    if isinstance(comments, list):
+        return comments
+    from reddit_data_extractor.parquet_store import parse_legacy_comments
+
+    return parse_legacy_comments(row.get("top_comments"))
+
+
+def triage_tokens(row):
+    # Word unigrams/bigrams from title and body, comment words with their own prefix (bodies only, authors and
+    # scores are left out), plus a few shape tokens (length and comment-count buckets), since a post without any
+    # useful comment can never be valid
+    title = str(row.get("title", "") or "")
+    selftext = str(row.get("selftext", "") or "")
+    comments = comment_records(row)
+    comment_text = " ".join(str(c.get("comment_body", "")) for c in comments)
+    comment_count = len(comments)
+
+    post_words = TOKEN_PATTERN.findall(f"{title} {selftext}".lower())
+    tokens = post_words + [f"{a}_{b}" for a, b in zip(post_words, post_words[1:])]
+    tokens += ["c:" + word for word in TOKEN_PATTERN.findall(comment_text.lower())]
+    tokens += [
+        f"__post_len_{_bucket(len(post_words), (10, 30, 80, 200))}",
+        f"__comment_len_{_bucket(len(comment_text), (0, 100, 400, 1200))}",
+        f"__comments_{min(comment_count, 3)}",
+    ]
+    return tokens
+
+
+# ---------- MODEL ----------
+# Bumped whenever triage_tokens changes, so a saved model trained on the old features is retrained
+FEATURES_VERSION = 2
+
+
+class TriageModel:
+    def __init__(self, class_counts=None, token_counts=None, min_count=2):
+        self.class_counts = class_counts or {"valid": 0, "invalid": 0}
+        self.token_counts = token_counts or {"valid": {}, "invalid": {}}
+        self.min_count = min_count
+        # Filled in by train_triage_model from the cross-validation report
+        self.threshold = 0.0
+        self.enabled = False
+        self.report = {}
+        self.history_days = []
+        self.features_version = FEATURES_VERSION
+        self._prepare()
+
+    def _prepare(self):
+        totals = Counter()
+        for counts in self.token_counts.values():
+            totals.update(counts)
+        self.vocabulary = {token for token, count in totals.items() if count >= self.min_count}
+        self.token_totals = {
+            label: sum(count for token, count in counts.items() if token in self.vocabulary)
+            for label, counts in self.token_counts.items()
+        }
+
+    @classmethod
+    def fit(cls, examples, min_count=2):
+        # examples: [(tokens, is_valid)]
+        class_counts = {"valid": 0, "invalid": 0}
+        token_counts = {"valid": Counter(), "invalid": Counter()}
+        for tokens, is_valid in examples:
+            label = "valid" if is_valid else "invalid"
+            class_counts[label] += 1
+            token_counts[label].update(tokens)
+        return cls(class_counts, {label: dict(counts) for label, counts in token_counts.items()}, min_count)
+
+    def prob_valid(self, tokens):
+        total = sum(self.class_counts.values())
+        vocabulary_size = len(self.vocabulary) + 1
+        scores = {}
+        for label, counts in self.token_counts.items():
+            score = math.log((self.class_counts[label] + 1) / (total + 2))
+            denominator = self.token_totals[label] + vocabulary_size
+            for token in tokens:
+                if token in self.vocabulary:
+                    score += math.log((counts.get(token, 0) + 1) / denominator)
+            scores[label] = score
+        top = max(scores.values())
+        valid, invalid = (math.exp(scores[label] - top) for label in ("valid", "invalid"))
+        return valid / (valid + invalid)
+
+    def to_dict(self):
+        return {
+            "class_counts": self.class_counts,
+            "token_counts": self.token_counts,
+            "min_count": self.min_count,
+            "threshold": self.threshold,
+            "enabled": self.enabled,
+            "report": self.report,
+            "history_days": self.history_days,
+            "features_version": self.features_version,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        model = cls(data["class_counts"], data["token_counts"], data.get("min_count", 2))
+        model.threshold = data.get("threshold", 0.0)
+        model.enabled = data.get("enabled", False)
+        model.report = data.get("report", {})
+        model.history_days = data.get("history_days", [])
+        model.features_version = data.get("features_version", 1)
+        return model
+
+    def save(self, path=TRIAGE_MODEL_FILE):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict()))
+
+    @classmethod
+    def load(cls, path=TRIAGE_MODEL_FILE):
+        return cls.from_dict(json.loads(Path(path).read_text()))
+
+
+# ---------- TRAINING DATA ----------
+def save_labels(day, labels, labels_dir=TRIAGE_LABELS_DIR):
+    # labels: {post_id: is_valid} for the posts the model answered that day
+    path = Path(labels_dir) / f"{day}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(labels))
+    tmp_path.replace(path)
+
+
+def _csv_file(data_dir, day):
+    return Path(data_dir) / "raw" / f"Reddit_CarAdvice_{day}.csv"
+
+
+def _read_csv_day(data_dir, day):
+    import pandas as pd
+
+    return pd.read_csv(_csv_file(data_dir, day), dtype={"id": str}).drop_duplicates("id", keep="last").fillna("")
+
+
+def labelled_days(data_dir=DATA_DIR, labels_dir=TRIAGE_LABELS_DIR):
+    # {day: label file, or None for a legacy day} for the days whose raw data is still around; only file names are
+    # looked at, so this is cheap enough to check on every run. A labelled day may only be in the Parquet store (the
+    # CSV mirror can be switched off); a legacy day needs its daily CSV, since the Parquet partitions do not keep the
+    # row order its labels come from.
+    raw_dir = Path(data_dir) / "raw"
+    parquet_days = {path.name.split("=", 1)[1] for path in (raw_dir / "parquet" / "posts").glob("date=*")}
+    days = {}
+    for cleaned_file in (Path(data_dir) / "cleaned").glob("Reddit_CarAdvice_Cleaned_*.csv"):
+        day = cleaned_file.stem.rsplit("_", 1)[-1]
+        if day <= TRIAGE_LEGACY_LAST_DAY and _csv_file(data_dir, day).exists():
+            days[day] = None
+    days.update((path.stem, path) for path in Path(labels_dir).glob("*.json")
+                if path.stem in parquet_days or _csv_file(data_dir, path.stem).exists())
+    return dict(sorted(days.items()))
+
+
+def load_raw_days(days, data_dir=DATA_DIR):
+    # {day: raw rows} read the way the cleaner reads a day (see utils.load_raw_data): the Parquet partition with its
+    # comments as records, or the daily CSV for a day that was never converted
+    from reddit_data_extractor.parquet_store import read_posts, read_comments, comments_by_post
+
+    frames = {}
+    parquet_dir = Path(data_dir) / "raw" / "parquet"
+    if days:
+        posts = read_posts(columns=["id", "title", "selftext", "date"], start_date=min(days), end_date=max(days),
+                           root=parquet_dir / "posts")
+        if posts is not None and not posts.empty:
+            records = comments_by_post(read_comments(start_date=min(days), end_date=max(days),
+                                                     root=parquet_dir / "comments"))
+            posts["comments"] = posts["id"].map(lambda post_id: records.get(post_id, []))
+            posts["date"] = posts["date"].astype(str)
+            frames = {day: frame for day, frame in posts.groupby("date", sort=False) if day in days}
+    for day in days:
+        if day not in frames and _csv_file(data_dir, day).exists():
+            frames[day] = _read_csv_day(data_dir, day)
+    return frames
+
+
+def _legacy_labels(data_dir, day, raw):
+    # The original cleaner sent the first rows of the day to the model and kept the valid answers
+    import pandas as pd
+
+    try:
+        cleaned = pd.read_csv(Path(data_dir) / "cleaned" / f"Reddit_CarAdvice_Cleaned_{day}.csv", dtype={"post_id": str})
+        valid_ids = set(cleaned["post_id"])
+    except pd.errors.EmptyDataError:
+        valid_ids = set()
+    return {post_id: post_id in valid_ids for post_id in raw["id"].head(TRIAGE_LEGACY_ROWS_PER_DAY)}
+
+
+def load_history(data_dir=DATA_DIR, labels_dir=TRIAGE_LABELS_DIR):
+    # [(day, row, is_valid)] for every post the model gave a verdict on. Rows the cleaner never sent (triage skips,
+    # unrecoverable answers, rows past LLM_MAX_ROWS) carry no label.
+    days = labelled_days(data_dir, labels_dir)
+    raw_days = load_raw_days([day for day, label_file in days.items() if label_file is not None], data_dir)
+    history = []
+    for day, label_file in days.items():
+        if label_file is None:
+            raw = _read_csv_day(data_dir, day)
+            labels = _legacy_labels(data_dir, day, raw)
+        elif day in raw_days:
+            raw = raw_days[day]
+            labels = json.loads(label_file.read_text())
+        else:
+            continue
+        for _, row in raw.iterrows():
+            if row["id"] in labels:
+                history.append((day, row, bool(labels[row["id"]])))
+    return history
+
+
+def cross_validated_scores(history, folds=5):
+    # [(P(valid), is_valid)] for every row, each scored by a model that never saw that row's day
+    days = sorted({day for day, _, _ in history})
+    fold_of = {day: i % folds for i, day in enumerate(days)}
+    tokens = [triage_tokens(row) for _, row, _ in history]
+    scores = [None] * len(history)
+    for fold in range(folds):
+        train = [(t, label) for t, (day, _, label) in zip(tokens, history) if fold_of[day] != fold]
+        model = TriageModel.fit(train)
+        for i, (t, (day, _, label)) in enumerate(zip(tokens, history)):
+            if fold_of[day] == fold:
+                scores[i] = (model.prob_valid(t), label)
+    return scores
+
+
+def roc_auc(scores):
+    # Probability that a random valid row scores above a random invalid one (rank formulation, ties count half)
+    ranked = sorted(scores, key=lambda item: item[0])
+    positives = sum(1 for _, label in scores if label)
+    negatives = len(scores) - positives
+    if not positives or not negatives:
+        return 0.5
+    rank_sum, i = 0.0, 0
+    while i < len(ranked):
+        j = i
+        while j < len(ranked) and ranked[j][0] == ranked[i][0]:
+            j += 1
+        average_rank = (i + j + 1) / 2
+        rank_sum += average_rank * sum(1 for _, label in ranked[i:j] if label)
+        i = j
+    return (rank_sum - positives * (positives + 1) / 2) / (positives * negatives)
+
+
+def calibrate_threshold(scores, target_recall=TRIAGE_TARGET_RECALL):
+    # Highest threshold that still sends at least target_recall of the valid rows to the LLM
+    valid_scores = sorted(score for score, label in scores if label)
+    if not valid_scores:
+        return 0.0
+    allowed_drops = int(len(valid_scores) * (1 - target_recall))
+    return valid_scores[allowed_drops]
+
+
+def evaluate(history, threshold=None, folds=5, scores=None):
+    # Day-grouped cross-validation. "Skipped" is what the cleaner would drop before the LLM; skipped valid
+    # posts are the pairs we would lose.
+    scores = cross_validated_scores(history, folds) if scores is None else scores
+    threshold = calibrate_threshold(scores) if threshold is None else threshold
+    skipped = sum(1 for score, _ in scores if score < threshold)
+    skipped_valid = sum(1 for score, label in scores if score < threshold and label)
+    valid_total = sum(1 for _, label in scores if label)
+    total = len(scores)
+
+    model = TriageModel.fit([(triage_tokens(row), label) for _, row, label in history])
+    start = time.perf_counter()
+    for _, row, _ in history:
+        model.prob_valid(triage_tokens(row))
+    predict_seconds = time.perf_counter() - start
+
+    return {
+        "rows": total,
+        "valid_rows": valid_total,
+        "auc": roc_auc(scores),
+        "threshold": threshold,
+        "skipped": skipped,
+        "skip_rate": skipped / total if total else 0.0,
+        "skip_precision": (skipped - skipped_valid) / skipped if skipped else 1.0,  # skipped rows that were invalid
+        "valid_recall": (valid_total - skipped_valid) / valid_total if valid_total else 1.0,  # valid rows still sent
+        "valid_dropped": skipped_valid,
+        "rows_per_second": total / predict_seconds if predict_seconds else float("inf"),
+    }
+
+
+def train_triage_model(history=None, path=TRIAGE_MODEL_FILE, threshold=TRIAGE_THRESHOLD, history_days=None):
+    history = load_history() if history is None else history
+    report = evaluate(history, threshold)
+    model = TriageModel.fit([(triage_tokens(row), label) for _, row, label in history])
+    model.threshold = report["threshold"]
+    model.enabled = report["auc"] >= TRIAGE_MIN_AUC
+    model.report = report
+    model.history_days = list(labelled_days()) if history_days is None else history_days
+    model.save(path)
+    return model
+
+
+def load_triage_model(logger, path=TRIAGE_MODEL_FILE):
+    # Retrained whenever the set of labelled days or the features changed since the saved model; the raw data is
+    # only read then
+    days = list(labelled_days())
+    if Path(path).exists():
+        model = TriageModel.load(path)
+        if (model.history_days == days and model.features_version == FEATURES_VERSION
+                and (TRIAGE_THRESHOLD is None or model.threshold == TRIAGE_THRESHOLD)):
+            return model
+    history = load_history()
+    logger.info(f"🧮 Training the triage model on {len(history)} labelled rows from {len(days)} day(s)")
+    return train_triage_model(history, path, history_days=days)
+
+
+def triage_rows(rows, model):
+    # Splits (idx, row) pairs into (kept, below_threshold) with the row order preserved inside both lists
+    kept, below = [], []
+    for idx, row in rows:
+        (kept if model.prob_valid(triage_tokens(row)) >= model.threshold else below).append((idx, row))
+    return kept, below
+
+
+def print_report(report):
+    print("=== Triage evaluation (day-grouped cross-validation) ===")
+    print(f" Labelled rows: {report['rows']} ({report['valid_rows']} valid)")
+    print(f" Cross-validated AUC: {report['auc']:.3f} (skipping needs >= {TRIAGE_MIN_AUC})")
+    print(f" Threshold P(valid) < {report['threshold']:.4f}: {report['skipped']} skipped "
+          f"({report['skip_rate'] * 100:.1f}% of LLM calls saved)")
+    print(f" Skip precision (skipped rows that were invalid): {report['skip_precision'] * 100:.1f}%")
+    print(f" Valid recall (valid rows still sent to the LLM): {report['valid_recall'] * 100:.1f}% "
+          f"({report['valid_dropped']} valid pairs dropped)")
+    print(f" Throughput: {report['rows_per_second']:.0f} rows/s")
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    # Run as a script: the raw data is read through reddit_data_extractor, which lives next to this package
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+    parser = argparse.ArgumentParser(description="Evaluate and train the pre-LLM triage classifier")
+    parser.add_argument("--threshold", type=float, default=TRIAGE_THRESHOLD,
+                        help="Fixed threshold instead of the recall-calibrated one")
+    args = parser.parse_args()
+
+    model = train_triage_model(threshold=args.threshold)
+    print_report(model.report)
+    print(f"💾 Saved triage model to {TRIAGE_MODEL_FILE} ({'enabled' if model.enabled else 'shadow mode'})")
@@ -0,0 +1,93 @@
+# This file contains the on-disk cache of LLM cleaning answers
+#
+# Keyed by a hash of the model name, the prompt version and the normalized post content (title, selftext and
+# formatted comments), so a retried task or the same post showing up in another day's raw file reuses the answer
+# instead of running inference again. Invalid answers are cached as well. Entries carry a last_used timestamp and
+# the least recently used ones are evicted once the cache grows past its cap.
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from config import RESPONSE_CACHE_FILE, RESPONSE_CACHE_MAX_ENTRIES
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(text):
+    return WHITESPACE.sub(' ', str(text or '')).strip()
+
+
+def cache_key(model, prompt_version, title, selftext, comments):
+    payload = "\0".join([model, prompt_version, normalize(title), normalize(selftext), normalize(comments)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path=RESPONSE_CACHE_FILE, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        # Shared by the cleaning threads; every statement runs under the lock
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " prompt_version TEXT NOT NULL,"
+            " answer TEXT NOT NULL,"
+            " created INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS llm_responses_last_used ON llm_responses (last_used)")
+        self._evict()  # a lowered cap applies straight away
+        self.conn.commit()
+
+    def get(self, key):
+        # The cached answer object, or None on a miss
+        with self._lock:
+            row = self.conn.execute("SELECT answer FROM llm_responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            self.conn.execute("UPDATE llm_responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key, model, prompt_version, answer):
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO llm_responses (key, model, prompt_version, answer, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET answer = excluded.answer, last_used = excluded.last_used",
+                (key, model, prompt_version, json.dumps(answer), int(now), now)
+            )
+            self.stats["stores"] += 1
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self.conn.execute(
+                "DELETE FROM llm_responses WHERE key IN "
+                "(SELECT key FROM llm_responses ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+            self.stats["evictions"] += overflow
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
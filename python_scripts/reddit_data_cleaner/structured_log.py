@@ -0,0 +1,94 @@
+# This file contains the structured, queue-based logging used by the cleaning hot loop
+#
+# Per-row and per-request records are emitted on "cleaner.<component>" loggers (row, llm, cascade, payload, pool)
+# with their data in extra={"fields": {...}}. Those loggers only put records on an in-memory queue; a QueueListener
+# thread writes them as JSON lines to the day's log file, so the cleaning threads never wait on file or console I/O.
+# Warnings and errors are also echoed to the console. Until start_logging() is called the records just propagate
+# to the root logger like any other.
+
+import atexit
+import hashlib
+import json
+import logging
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+from config import LOG_LEVELS, LOG_PAYLOAD_SAMPLE
+
+ROOT = "cleaner"
+
+_listener = None
+_log_file = None
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "component": record.name[len(ROOT) + 1:] if record.name.startswith(f"{ROOT}.") else record.name,
+            "thread": record.threadName,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def component_logger(component):
+    return logging.getLogger(f"{ROOT}.{component}")
+
+
+def start_logging(log_file, levels=LOG_LEVELS):
+    # Routes every component logger to log_file (appending) through the queue; switching to another file
+    # (the next day of a backfill) flushes and closes the previous one first
+    global _listener, _log_file
+    log_file = Path(log_file)
+    if _listener is not None and _log_file == log_file:
+        return
+    stop_logging()
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+
+    file_handler = logging.FileHandler(log_file, encoding="utf-8")
+    file_handler.setFormatter(JsonLinesFormatter())
+    console = logging.StreamHandler()
+    console.setLevel(logging.WARNING)
+    console.setFormatter(logging.Formatter("%(levelname)s [%(name)s] %(message)s"))
+
+    records = queue.SimpleQueue()
+    root = logging.getLogger(ROOT)
+    root.handlers = [QueueHandler(records)]
+    root.propagate = False
+    root.setLevel(logging.INFO)
+    for component, level in levels.items():
+        component_logger(component).setLevel(level)
+    # httpx logs every request to Ollama at INFO, synchronously on the calling thread
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    _listener = QueueListener(records, file_handler, console, respect_handler_level=True)
+    _listener.start()
+    _log_file = log_file
+
+
+def stop_logging():
+    # Drains the queue and closes the log file; records go back to the root logger afterwards
+    global _listener, _log_file
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    root = logging.getLogger(ROOT)
+    root.handlers = []
+    root.propagate = True
+    _listener, _log_file = None, None
+
+
+atexit.register(stop_logging)
+
+
+def payload_sampled(key, rate=LOG_PAYLOAD_SAMPLE):
+    # Deterministic sample of the prompts/answers worth logging in full, so a rerun logs the same ones
+    if rate <= 0:
+        return False
+    return rate >= 1 or int(hashlib.sha1(key.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF < rate
@@ -3,23 +3,51 @@ from pathlib import Path
 from datetime import datetime
 import pandas as pd
 import json
+import re
 
-def get_paths():
+DAY_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2})')
+
+def get_paths(day=None):
+    # day is a "YYYY-MM-DD" string; today when left out
     project_root = Path(__file__).resolve().parents[2]
     raw_dir = project_root / "data" / "raw"
     cleaned_dir = project_root / "data" / "cleaned"
-    today_str = datetime.now().strftime("%Y-%m-%d")
-    raw_file = raw_dir / f"Reddit_CarAdvice_{today_str}.csv"
-    cleaned_file = cleaned_dir / f"Reddit_CarAdvice_Cleaned_{today_str}.csv"
+    day_str = day or datetime.now().strftime("%Y-%m-%d")
+    raw_file = raw_dir / f"Reddit_CarAdvice_{day_str}.csv"
+    cleaned_file = cleaned_dir / f"Reddit_CarAdvice_Cleaned_{day_str}.csv"
     return raw_dir, cleaned_dir, raw_file, cleaned_file
 
 
+def find_uncleaned_days(raw_dir: Path, cleaned_dir: Path) -> list:
+    # Days with raw data (a daily CSV or a Parquet partition) but no cleaned file yet, oldest first.
+    # A day whose cleaning was interrupted has a journal but no cleaned file, so it is picked up as well.
+    days = {match.group(1) for path in raw_dir.glob("Reddit_CarAdvice_*.csv")
+            if (match := DAY_PATTERN.search(path.name))}
+    days |= {path.name.split("=", 1)[1] for path in (raw_dir / "parquet" / "posts").glob("date=*")}
+    return sorted(day for day in days if not (cleaned_dir / f"Reddit_CarAdvice_Cleaned_{day}.csv").exists())
+
+
 def load_raw_data(raw_file: Path, logger):
+    # Prefer the day's partition of the Parquet store, fall back to the daily CSV for older days.
+    # Imported here so that importing utils does not load fastparquet.
+    from reddit_data_extractor.parquet_store import read_posts, read_comments, comments_by_post, date_for_file
+
+    date_str = date_for_file(raw_file)
+    df = read_posts(start_date=date_str, end_date=date_str)
+    if df is not None and not df.empty:
+        logger.info(f"📥 Reading raw Parquet partition date={date_str} ({len(df)} rows)")
+        # Structured comments ride along as a list of records; no flattened string to re-parse
+        records = comments_by_post(read_comments(start_date=date_str, end_date=date_str))
+        df['comments'] = df['id'].map(lambda post_id: records.get(post_id, []))
+        return df
+
     if not raw_file.exists():
         logger.warning("⏭️ Today's raw file not found. Skipping cleaning.")
         return None
     logger.info(f"📥 Reading raw CSV: {raw_file}")
-    return pd.read_csv(raw_file)
+    # The extractor's writer replaces a changed post's row by id, so current files hold one row per id. Daily files
+    # written before that still repeat a post once per change, so the last row per id is kept as a guard for them.
+    return pd.read_csv(raw_file).drop_duplicates('id', keep='last').reset_index(drop=True)
 
 def should_skip_cleaning(cleaned_file: Path, logger) -> bool:
     if cleaned_file.exists():
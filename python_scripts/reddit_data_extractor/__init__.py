@@ -5,24 +5,66 @@ This package contains:
 - config.py: Subreddit list, date ranges, API limits, and file paths
 - reddit_client.py: Reddit PRAW API setup
 - utils.py: Helpers for fetching posts and filtering comments
+- comment_fetcher.py: Shallow, score-sorted comment fetching pipelined across posts
+- rate_governor.py: Adaptive rate limiting from Reddit's X-Ratelimit-* headers
+- watermarks.py: Per-subreddit watermarks for incremental listing pagination
+- seen_index.py: SQLite index of already-written posts for idempotent re-runs
 - scraper.py: Main logic for orchestrating data extraction
-- writer.py: Writes extracted post data to CSV
+- async_scraper.py: Concurrent (asyncio) variant of the extraction loop
+- writer.py: Streams extracted post data to the Parquet store and the daily CSV
+- work_queue.py: Durable SQLite work queue (leases/acks) handing extracted posts to the LLM cleaner
+- parquet_store.py: Date/subreddit-partitioned Parquet raw store with a filtering reader
 - flow.py: Prefect flow to orchestrate the extraction pipeline
+- fake_reddit.py: Offline stand-in server replaying raw CSVs as Reddit endpoints
+- benchmark.py: Throughput/memory benchmark of the extractors against fake_reddit.py
+
+Submodules and the entry points below are imported lazily on first attribute access, so importing the
+package does not pull in praw, pandas or prefect.
 """
 
-from .scraper import extract_reddit_data
-from .flow import reddit_pipeline
-from . import config, reddit_client, utils, writer, scraper, flow
+import importlib
+
+_LAZY_ATTRIBUTES = {
+    "extract_reddit_data": "scraper",
+    "extract_reddit_data_async": "async_scraper",
+    "run_async_extraction": "async_scraper",
+    "reddit_pipeline": "flow",
+}
+
+_SUBMODULES = {
+    "config", "reddit_client", "utils", "comment_fetcher", "rate_governor", "watermarks", "seen_index",
+    "parquet_store", "writer", "work_queue", "scraper", "async_scraper", "flow", "fake_reddit", "benchmark"
+}
 
 __version__ = "1.0.0"
 
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(f".{_LAZY_ATTRIBUTES[name]}", __name__)
+        return getattr(module, name)
+    if name in _SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 __all__ = [
     "extract_reddit_data",
+    "extract_reddit_data_async",
+    "run_async_extraction",
     "reddit_pipeline",
     "config",
     "reddit_client",
     "utils",
+    "comment_fetcher",
+    "rate_governor",
+    "watermarks",
+    "seen_index",
+    "parquet_store",
     "writer",
+    "work_queue",
     "scraper",
-    "flow"
+    "async_scraper",
+    "flow",
+    "fake_reddit",
+    "benchmark"
 ]
@@ -0,0 +1,159 @@
+# async_scraper.py — Concurrent version of scraper.extract_reddit_data
+#
+# PRAW is a blocking client, so every Reddit call runs in a worker thread through asyncio.to_thread.
+# PRAW is not thread-safe either, so each worker thread uses its own Reddit instance (get_thread_client).
+# A single semaphore caps how many of those calls are in flight at once (MAX_CONCURRENT_REQUESTS).
+# Listings and comment trees for all subreddits are fetched concurrently, but the results are walked
+# in the same order as the serial loop, so the saved CSV and the counters match the serial path.
+# Each subreddit hands its posts to the writer through a bounded queue, drained in SUBREDDITS order: a subreddit
+# that runs ahead of the writer waits once its queue holds WRITE_CHUNK_SIZE posts instead of piling them up.
+# Comment fetches run at most max_concurrency posts ahead of that walk: a thread that already started cannot be
+# cancelled, so posts past MAX_POSTS_PER_SUBREDDIT only cost the few requests already in flight.
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .config import SUBREDDITS, MAX_POSTS_PER_SUBREDDIT, MAX_CONCURRENT_REQUESTS, START_TIMESTAMP, END_TIMESTAMP, CSV_FILE, \
+    WRITE_CHUNK_SIZE
+from .reddit_client import get_thread_client
+from .utils import fetch_posts_with_praw
+from .comment_fetcher import fetch_top_comments
+from .writer import ChunkedWriter
+from .rate_governor import RateGovernor
+from .seen_index import SeenPostIndex
+from .watermarks import load_watermarks, save_watermarks, listing_lower_bound, newest_in_window, hold_for_retry
+from .scraper import logger, new_counters, is_candidate, build_post_entry, chunk_written, log_counters
+
+
+def _fetch_comments_in_thread(submission_id, post_counters, governor):
+    return fetch_top_comments(get_thread_client(), submission_id, post_counters, governor)
+
+
+def _fetch_listing_in_thread(subreddit, governor, stop_before, exclusive):
+    return fetch_posts_with_praw(get_thread_client(), subreddit, MAX_POSTS_PER_SUBREDDIT, governor, stop_before, exclusive)
+
+
+async def _fetch_comments(submission, semaphore, governor):
+    # Each post gets its own skip counter, merged later only if the serial loop would have reached it
+    post_counters = {'comments_skipped': 0}
+    async with semaphore:
+        comments = await asyncio.to_thread(_fetch_comments_in_thread, submission.id, post_counters, governor)
+    return comments, post_counters
+
+
+async def _extract_subreddit(subreddit, semaphore, governor, watermarks, seen_index, max_ahead, output):
+    # Puts the subreddit's posts on output as they are collected, then None once it is done (or failed)
+    try:
+        return await _walk_subreddit(subreddit, semaphore, governor, watermarks, seen_index, max_ahead, output)
+    finally:
+        await output.put(None)
+
+
+async def _walk_subreddit(subreddit, semaphore, governor, watermarks, seen_index, max_ahead, output):
+    logger.info(f"=== Starting r/{subreddit} ===")
+    counters = new_counters()
+
+    stop_before, exclusive = listing_lower_bound(watermarks, subreddit)
+    async with semaphore:
+        posts = await asyncio.to_thread(_fetch_listing_in_thread, subreddit, governor, stop_before, exclusive)
+    newest = newest_in_window(posts, watermarks.get(subreddit))
+
+    # Comment fetches for the posts that pass the cheap filters, launched in listing order as the walk advances
+    candidates = [submission for submission in posts if is_candidate(submission)]
+    known = seen_index.known_unchanged(candidates)
+    upcoming = iter([submission for submission in candidates if submission.id not in known])
+    pending = {}
+
+    def prefetch():
+        while len(pending) < max_ahead:
+            submission = next(upcoming, None)
+            if submission is None:
+                return
+            pending[submission.id] = asyncio.create_task(_fetch_comments(submission, semaphore, governor))
+
+    # Walk the listing exactly like the serial loop does
+    post_count = 0
+    unfinished = []  # posts to list again next run, see hold_for_retry
+    for submission in posts:
+        counters['total_posts_fetched'] += 1
+
+        if post_count >= MAX_POSTS_PER_SUBREDDIT:
+            break
+
+        if not (START_TIMESTAMP <= submission.created_utc <= END_TIMESTAMP):
+            counters['posts_filtered_time'] += 1
+            continue
+        if submission.num_comments == 0:
+            counters['posts_filtered_comments'] += 1
+            continue
+        if submission.id in known:
+            counters['posts_skipped_known'] += 1
+            continue
+
+        try:
+            prefetch()
+            comments, post_counters = await pending.pop(submission.id)
+            counters['comments_skipped'] += post_counters['comments_skipped']
+
+            if comments:
+                await output.put(build_post_entry(submission, subreddit, comments))
+                post_count += 1
+                counters['valid_posts_stored'] += 1
+
+                if post_count % 10 == 0:
+                    logger.info(f"Collected {post_count} posts from r/{subreddit} ===")
+            else:
+                unfinished.append(submission)
+
+        except Exception as e:
+            logger.info(f"Error processing post {submission.id}: {e} ===")
+            unfinished.append(submission)
+            continue
+
+    # Posts past the cap were fetched speculatively; drop their results (queued fetches never start)
+    for task in pending.values():
+        task.cancel()
+
+    return counters, hold_for_retry(newest, unfinished)
+
+
+async def extract_reddit_data_async(max_concurrency=MAX_CONCURRENT_REQUESTS, work_queue=None):
+    start_time = time.time()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    # The default executor has min(32, CPUs + 4) threads, fewer than max_concurrency on small CI runners;
+    # its threads are long-lived, so each Reddit instance (and OAuth token) is created once per thread
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="reddit"))
+    governor = RateGovernor(client_for_thread=get_thread_client)
+    watermarks = load_watermarks()
+    seen_index = SeenPostIndex()
+
+    outputs = [asyncio.Queue(maxsize=WRITE_CHUNK_SIZE) for _ in SUBREDDITS]
+    tasks = [
+        asyncio.create_task(
+            _extract_subreddit(subreddit, semaphore, governor, watermarks, seen_index, max_concurrency, output))
+        for subreddit, output in zip(SUBREDDITS, outputs)
+    ]
+
+    # Stream each subreddit to disk in SUBREDDITS order so the output matches the serial path
+    writer = ChunkedWriter(CSV_FILE, on_flush=lambda posts: chunk_written(posts, writer, seen_index, work_queue))
+    counters = new_counters()
+    new_watermarks = dict(watermarks)
+    for subreddit, output, task in zip(SUBREDDITS, outputs, tasks):
+        while (post := await output.get()) is not None:
+            writer.add(post)
+        subreddit_counters, newest = await task
+        writer.flush()
+        for key, value in subreddit_counters.items():
+            counters[key] += value
+        if newest is not None:
+            new_watermarks[subreddit] = newest
+
+    writer.finalize()
+    seen_index.close()
+    save_watermarks(new_watermarks)
+    log_counters(counters, start_time, governor)
+
+
+def run_async_extraction(max_concurrency=MAX_CONCURRENT_REQUESTS, work_queue=None):
+    asyncio.run(extract_reddit_data_async(max_concurrency, work_queue))
@@ -0,0 +1,155 @@
+# benchmark.py — Offline extractor throughput benchmark against fake_reddit.py
+#
+# Usage (from the project root):
+#   python -m python_scripts.reddit_data_extractor.benchmark --latency-ms 50 --days 2
+#
+# Each target runs in a fresh interpreter, with its own temporary REDDIT_DATA_DIR and with PRAW and the
+# JSON listing pointed at the stand-in server. The report lists posts/sec, requests per stored post
+# (from the server's own counts) and peak memory (tracemalloc peak and max RSS) for every target.
+#
+# The default budget is Reddit's 1000 requests per 600 s window, and prawcore spreads requests evenly across
+# it, so wall time is dominated by that pacing. Pass e.g. --rate-limit 1000000 to measure raw throughput.
+
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+TARGETS = {
+    'scraper': ('python_scripts.reddit_data_extractor.scraper', 'extract_reddit_data'),
+    'scraper_async': ('python_scripts.reddit_data_extractor.async_scraper', 'run_async_extraction'),
+    'extractor': ('python_scripts.reddit_data_extractor.extractor', 'extract_reddit_data'),
+}
+
+RESULT_PREFIX = "BENCH_RESULT "
+
+
+# ---------- WORKER (runs inside the child interpreter) ----------
+def _count_stored_posts(data_dir):
+    ids = set()
+    for csv_file in Path(data_dir).rglob("Reddit_CarAdvice_*.csv"):
+        with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+            ids.update(row['id'] for row in csv.DictReader(f))
+    return len(ids)
+
+
+def run_worker(target):
+    import importlib
+    import resource
+    import tracemalloc
+
+    module_name, function_name = TARGETS[target]
+    function = getattr(importlib.import_module(module_name), function_name)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        'seconds': elapsed,
+        'stored_posts': _count_stored_posts(os.environ['REDDIT_DATA_DIR']),
+        'tracemalloc_peak_mb': peak / 2 ** 20,
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    print(RESULT_PREFIX + json.dumps(result))
+
+
+# ---------- PARENT ----------
+def run_target(target, base_url, fake):
+    fake.reset_counts()
+    with tempfile.TemporaryDirectory(prefix=f"bench_{target}_") as data_dir:
+        env = dict(
+            os.environ,
+            REDDIT_CLIENT_ID='benchmark',
+            REDDIT_CLIENT_SECRET='benchmark',
+            REDDIT_USER_AGENT='benchmark:car-clinic:1.0',
+            REDDIT_URL=base_url,
+            REDDIT_OAUTH_URL=base_url,
+            REDDIT_DATA_DIR=data_dir,
+        )
+        completed = subprocess.run(
+            [sys.executable, '-m', 'python_scripts.reddit_data_extractor.benchmark', '--worker', target],
+            cwd=PROJECT_ROOT, env=env, capture_output=True, text=True
+        )
+
+    lines = [line for line in completed.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+    if completed.returncode != 0 or not lines:
+        print(f"❌ {target} failed:\n{completed.stderr[-2000:]}")
+        return None
+
+    result = json.loads(lines[-1][len(RESULT_PREFIX):])
+    counts = dict(fake.request_counts)
+    requests = sum(count for endpoint, count in counts.items() if endpoint != 'token')
+    stored = result['stored_posts']
+    result.update({
+        'target': target,
+        'requests': requests,
+        'listing_requests': counts.get('listing', 0),
+        'comment_requests': counts.get('comments', 0),
+        'posts_per_sec': stored / result['seconds'] if result['seconds'] else 0.0,
+        'requests_per_post': requests / stored if stored else float('inf'),
+    })
+    return result
+
+
+def print_report(results):
+    print("\n=== Extractor Benchmark ===")
+    header = f"{'target':<14}{'posts':>7}{'sec':>9}{'posts/s':>9}{'reqs':>7}{'list':>6}{'cmts':>6}{'req/post':>10}{'peak MB':>9}{'rss MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['target']:<14}{r['stored_posts']:>7}{r['seconds']:>9.2f}{r['posts_per_sec']:>9.2f}"
+              f"{r['requests']:>7}{r['listing_requests']:>6}{r['comment_requests']:>6}"
+              f"{r['requests_per_post']:>10.2f}{r['tracemalloc_peak_mb']:>9.1f}{r['max_rss_mb']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline extractor benchmark")
+    parser.add_argument("--worker", choices=sorted(TARGETS), help=argparse.SUPPRESS)
+    parser.add_argument("--targets", nargs="+", choices=sorted(TARGETS), default=list(TARGETS))
+    parser.add_argument("--days", type=int, default=2, help="Number of most recent raw CSVs to replay")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--rate-limit", type=int, default=1000, help="Requests allowed per window")
+    parser.add_argument("--window-seconds", type=int, default=600)
+    parser.add_argument("--json", type=Path, help="Also write the results to this file")
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker)
+        return
+
+    from .fake_reddit import FakeReddit, load_fixtures, default_fixture_files
+
+    fixture_files = default_fixture_files(args.days)
+    print(f"📦 Replaying {len(fixture_files)} raw file(s): {', '.join(f.name for f in fixture_files)}")
+    fake = FakeReddit(*load_fixtures(fixture_files), latency_ms=args.latency_ms,
+                      rate_limit=args.rate_limit, window_seconds=args.window_seconds)
+    base_url = fake.start()
+
+    results = []
+    try:
+        for target in args.targets:
+            print(f"⏱️ Running {target}...")
+            result = run_target(target, base_url, fake)
+            if result:
+                results.append(result)
+    finally:
+        fake.stop()
+
+    print_report(results)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
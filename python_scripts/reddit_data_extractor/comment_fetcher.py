@@ -0,0 +1,75 @@
+# This file contains the minimal-payload comment fetcher
+#
+# process_comments() calls replace_more() and loads the whole comment forest just to keep 3 comments.
+# Here we ask Reddit's comments endpoint for a shallow (depth=1), limited, score-sorted slice instead,
+# and CommentFetcher pipelines those requests for a whole listing page through a small thread pool.
+# PRAW is not thread-safe, so each pool thread uses its own Reddit instance; the pool is kept for the whole run
+# so those instances (and their OAuth tokens) are created once per thread.
+
+from concurrent.futures import ThreadPoolExecutor
+from .config import TOP_COMMENTS_PER_POST, COMMENT_SORT, COMMENT_FETCH_WORKERS
+from .utils import is_bot_comment, _governed
+from .reddit_client import get_thread_client
+
+
+def _comment_record(data):
+    # PRAW renders a deleted author as str(None); keep the same value so records match process_comments
+    author = data.get('author')
+    return {
+        'comment_id': data['id'],
+        'comment_body': data['body'],
+        'comment_score': data['score'],
+        'comment_author': 'None' if author in (None, '[deleted]') else author
+    }
+
+
+def fetch_top_comments(reddit, submission_id, counters, governor=None):
+    try:
+        response = _governed(
+            governor,
+            reddit.request,
+            method="GET",
+            path=f"comments/{submission_id}",
+            params={'limit': TOP_COMMENTS_PER_POST, 'depth': 1, 'sort': COMMENT_SORT, 'raw_json': 1}
+        )
+        # The endpoint returns [submission listing, comment listing]; "more" stubs are skipped
+        children = response[1]['data']['children']
+        top_level = [child['data'] for child in children if child['kind'] == 't1'][:TOP_COMMENTS_PER_POST]
+
+        valid_comments = []
+        for comment in top_level:
+            if is_bot_comment(comment['body']):
+                counters['comments_skipped'] += 1
+                continue
+            valid_comments.append(_comment_record(comment))
+
+        return valid_comments
+    except Exception as e:
+        print(f"Comment error in post {submission_id}: {e}")
+        return []
+
+
+class CommentFetcher:
+    def __init__(self, governor=None, max_workers=COMMENT_FETCH_WORKERS):
+        self.governor = governor
+        self.max_workers = max_workers
+        self._executor = None
+
+    def _fetch_one(self, submission_id):
+        post_counters = {'comments_skipped': 0}
+        comments = fetch_top_comments(get_thread_client(), submission_id, post_counters, self.governor)
+        return comments, post_counters
+
+    def fetch_many(self, submission_ids):
+        # Returns {id: (comments, per-post counters)}; callers merge the counters in listing order
+        submission_ids = list(submission_ids)
+        if not submission_ids:
+            return {}
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="comments")
+        return dict(zip(submission_ids, self._executor.map(self._fetch_one, submission_ids)))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
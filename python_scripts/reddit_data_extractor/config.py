@@ -1,5 +1,6 @@
 # This file contains Configs like subreddit list, limits, API credentials
 
+import os
 from datetime import datetime, timedelta
 from pathlib import Path
 
@@ -12,6 +13,21 @@ SUBREDDITS = [
 POST_LIMIT_PER_PAGE = 100
 MAX_POSTS_PER_SUBREDDIT = 500
 
+# Comments: only a shallow, score-sorted slice of each thread is requested
+TOP_COMMENTS_PER_POST = 3
+COMMENT_SORT = "top"
+COMMENT_FETCH_WORKERS = 4  # in-flight comment requests when prefetching a listing page
+BOT_PHRASES = ["Thanks for posting", "I am a bot", "Please read the rules"]
+
+# Extraction mode: "async" runs subreddits and comment fetches concurrently, "serial" is the original loop
+EXTRACTION_MODE = os.getenv("REDDIT_EXTRACTION_MODE", "async")
+MAX_CONCURRENT_REQUESTS = int(os.getenv("REDDIT_MAX_CONCURRENCY", "8"))
+
+# Rate governor: wait for the window reset once fewer than this many requests remain
+RATE_LIMIT_MIN_REMAINING = 5
+RATE_LIMIT_MAX_RETRIES = 5
+RATE_LIMIT_BACKOFF_SECONDS = 2  # doubled on every consecutive 429 without a Retry-After header
+
 headers = {
     'User-Agent': 'MyRedditScraper/2.0 (by /u/YOUR_USERNAME)'
 }
@@ -22,11 +38,34 @@ END_TIMESTAMP = int(yesterday.replace(hour=23, minute=59, second=59).timestamp()
 
 # Paths
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
-DATA_DIR = PROJECT_ROOT / "data"
-DATA_DIR.mkdir(parents=True, exist_ok=True)
+DATA_DIR = Path(os.getenv("REDDIT_DATA_DIR", PROJECT_ROOT / "data"))  # overridable for offline runs/benchmarks
 # CSV_FILE = DATA_DIR / f"Reddit_CarAdvice_{datetime.utcnow().strftime('%Y-%m-%d')}.csv" # outdated subdirectory
 
-RAW_DATA_DIR = DATA_DIR / "raw"
-RAW_DATA_DIR.mkdir(parents=True, exist_ok=True)
+RAW_DATA_DIR = DATA_DIR / "raw"  # created by the writer on first use, importing config does no I/O
 
 CSV_FILE = RAW_DATA_DIR / f"Reddit_CarAdvice_{datetime.utcnow().strftime('%Y-%m-%d')}.csv"
+
+# Partitioned Parquet store (posts: date=YYYY-MM-DD/subreddit=<name>/, comments: date=YYYY-MM-DD/), the primary raw format.
+# The daily CSV is still written next to it for the workflow artifacts and older tooling.
+RAW_PARQUET_DIR = RAW_DATA_DIR / "parquet"
+POSTS_PARQUET_DIR = RAW_PARQUET_DIR / "posts"
+COMMENTS_PARQUET_DIR = RAW_PARQUET_DIR / "comments"  # one row per kept comment, keyed by post_id
+PARQUET_COMPRESSION = "SNAPPY"
+WRITE_CSV_MIRROR = os.getenv("REDDIT_WRITE_CSV_MIRROR", "1") == "1"
+
+# Per-subreddit "newest created_utc seen" so repeated runs over the same window only request new pages
+STATE_DIR = DATA_DIR / "state"
+WATERMARK_FILE = STATE_DIR / "watermarks.json"
+USE_WATERMARKS = os.getenv("REDDIT_USE_WATERMARKS", "1") == "1"
+
+# Index of posts already written (id + content hash), so retries and re-runs skip their comment fetches
+SEEN_INDEX_FILE = STATE_DIR / "seen_posts.sqlite3"
+
+# Streaming writer: posts are flushed to durable chunk files and merged into the daily file at the end
+STAGING_DIR = STATE_DIR / "staging"
+WRITE_CHUNK_SIZE = 50
+
+# Work queue handing posts from the extractor to a concurrently running cleaner (run_pipeline.py stream)
+WORK_QUEUE_FILE = STATE_DIR / "work_queue.sqlite3"
+WORK_QUEUE_LEASE_SECONDS = int(os.getenv("REDDIT_WORK_QUEUE_LEASE_SECONDS", "900"))
+WORK_QUEUE_MAX_ATTEMPTS = 3
@@ -5,6 +5,15 @@ import os
 from datetime import datetime, timedelta
 import praw
 from pathlib import Path
+try:
+    from .rate_governor import RateGovernor
+    from .reddit_client import endpoint_overrides
+except ImportError:
+    # Run as a script (python extractor.py): load the package modules through python_scripts/ instead
+    import sys
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+    from reddit_data_extractor.rate_governor import RateGovernor
+    from reddit_data_extractor.reddit_client import endpoint_overrides
 
 
 def extract_reddit_data():
@@ -41,7 +50,7 @@ def extract_reddit_data():
 
     # Get project root: go 3 levels up from this file
     PROJECT_ROOT = Path(__file__).resolve().parents[2]
-    DATA_DIR = PROJECT_ROOT / "data"
+    DATA_DIR = Path(os.getenv("REDDIT_DATA_DIR", PROJECT_ROOT / "data"))
     DATA_DIR.mkdir(parents=True, exist_ok=True)  # Ensure it exists
 
     # Use today's date in file name
@@ -52,10 +61,16 @@ def extract_reddit_data():
     reddit = praw.Reddit(
         client_id=os.environ['REDDIT_CLIENT_ID'],
         client_secret=os.environ['REDDIT_CLIENT_SECRET'],
-        user_agent=os.environ['REDDIT_USER_AGENT']
+        user_agent=os.environ['REDDIT_USER_AGENT'],
+        **endpoint_overrides()
     )
 
+    # Rate governors: PRAW (OAuth) and the public JSON listing have separate quotas
+    praw_governor = RateGovernor(reddit)
+    json_governor = RateGovernor()
+
     # Headers for JSON API
+    REDDIT_URL = os.getenv('REDDIT_URL', 'https://www.reddit.com')
     headers = {
         'User-Agent': 'MyRedditScraper/2.0 (by /u/YOUR_USERNAME)'
     }
@@ -74,8 +89,9 @@ def extract_reddit_data():
         }
 
         try:
-            response = httpx.get(
-                f'https://www.reddit.com/r/{subreddit}/new.json',
+            response = json_governor.call(
+                httpx.get,
+                f'{REDDIT_URL}/r/{subreddit}/new.json',
                 headers=headers,
                 params=params
             )
@@ -87,9 +103,11 @@ def extract_reddit_data():
 
     def process_comments(submission):
         try:
-            submission.comments.replace_more(limit=0)
+            # Reading submission.comments is what fetches the thread; replace_more(limit=0) only drops the stubs
+            forest = praw_governor.call(lambda: submission.comments)
+            forest.replace_more(limit=0)
             valid_comments = []
-            for comment in submission.comments[:3]:
+            for comment in forest[:3]:
                 if any(phrase in comment.body for phrase in [
                     "Thanks for posting",
                     "I am a bot",
@@ -123,6 +141,7 @@ def extract_reddit_data():
             if not data:
                 break
 
+            passed_window = False
             for post in data['children']:
                 counters['total_posts_fetched'] += 1
                 if post_count >= MAX_POSTS_PER_SUBREDDIT:
@@ -130,7 +149,11 @@ def extract_reddit_data():
 
                 post_data = post['data']
 
-                if not (start_timestamp <= post_data['created_utc'] <= end_timestamp):
+                # /new is newest-first: past the window's lower bound nothing else can match
+                if post_data['created_utc'] < start_timestamp:
+                    passed_window = True
+                    break
+                if post_data['created_utc'] > end_timestamp:
                     counters['posts_filtered_time'] += 1
                     continue
                 if post_data['num_comments'] == 0:
@@ -164,13 +187,15 @@ def extract_reddit_data():
                     print(f"Error processing post {post_data['id']}: {e}")
                     continue
 
+            if passed_window:
+                print(f"Reached the time window edge in r/{subreddit} (got {post_count}/{MAX_POSTS_PER_SUBREDDIT})")
+                break
+
             after = data['after']
             if not after:
                 print(f"No more posts in r/{subreddit} (got {post_count}/{MAX_POSTS_PER_SUBREDDIT})")
                 break
 
-            time.sleep(3)
-
     # ---------- DATA SAVING ----------
     if all_posts:
         scraping_time_unix = int(time.time())
@@ -209,6 +234,11 @@ def extract_reddit_data():
     for key, value in counters.items():
         print(f"{key}: {value}")
 
+    print("\n=== Rate Governor ===")
+    for name, governor in (('praw', praw_governor), ('json', json_governor)):
+        for key, value in governor.report().items():
+            print(f"{name}_{key}: {value}")
+
     # ---------- EXECUTION TIME ----------
     execution_time = (time.time() - start_time) / 60
     print(f"\nCompleted in {execution_time:.2f} minutes")
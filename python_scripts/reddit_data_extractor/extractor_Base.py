@@ -10,6 +10,13 @@ import os
 from datetime import datetime, timedelta
 import praw
 from pathlib import Path
+try:
+    from .rate_governor import RateGovernor
+except ImportError:
+    # Run as a script (python extractor_Base.py): load the package modules through python_scripts/ instead
+    import sys
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+    from reddit_data_extractor.rate_governor import RateGovernor
 
 
 def extract_reddit_data():
@@ -54,6 +61,10 @@ def extract_reddit_data():
         user_agent='User-Agent: script:MyDataScraperForLLM:3.0 (by /u/Many-Refuse5176)'
     )
 
+    # Rate governors: PRAW (OAuth) and the public JSON listing have separate quotas
+    praw_governor = RateGovernor(reddit)
+    json_governor = RateGovernor()
+
     # Headers for JSON API
     headers = {
         'User-Agent': 'MyRedditScraper/2.0 (by /u/YOUR_USERNAME)'
@@ -75,7 +86,8 @@ def extract_reddit_data():
         }
 
         try:
-            response = httpx.get(
+            response = json_governor.call(
+                httpx.get,
                 f'https://www.reddit.com/r/{subreddit}/new.json',
                 headers=headers,
                 params=params
@@ -90,7 +102,9 @@ def extract_reddit_data():
     def process_comments(submission):
         """Efficient comment processing with filtering"""
         try:
-            submission.comments.replace_more(limit=0)  # Remove 'load more' comments
+            # Reading submission.comments is what fetches the thread; replace_more(limit=0) only drops the stubs
+            forest = praw_governor.call(lambda: submission.comments)
+            forest.replace_more(limit=0)  # Remove 'load more' comments
             return [
                 {
                     'comment_id': comment.id,
@@ -98,7 +112,7 @@ def extract_reddit_data():
                     'comment_score': comment.score,
                     'comment_author': str(comment.author)
                 }
-                for comment in submission.comments[:3]  # Only top 3 comments
+                for comment in forest[:3]  # Only top 3 comments
                 if not any(phrase in comment.body for phrase in [
                     "Thanks for posting",
                     "I am a bot",
@@ -175,8 +189,7 @@ def extract_reddit_data():
                 print(f"No more posts in r/{subreddit} (got {post_count}/{MAX_POSTS_PER_SUBREDDIT})")
                 break
 
-            # Conservative rate limiting
-            time.sleep(3)  # Increased from 2 to 3 seconds
+            # Rate limiting is handled by the governors from the X-Ratelimit-* headers
 
 
 
@@ -0,0 +1,241 @@
+# fake_reddit.py — Offline stand-in for the Reddit endpoints the extractors use
+#
+# Serves record/replay fixtures built from our own daily raw CSVs:
+#   POST /api/v1/access_token           -> dummy OAuth token (PRAW read-only client credentials)
+#   GET  /r/<sub>/new[.json]            -> newest-first listing pages (limit <= 100, after=t3_<id>)
+#   GET  /comments/<id>[.json]          -> [post listing, top-level comment listing] (limit/depth honoured)
+# Every response carries X-Ratelimit-Remaining/Used/Reset headers from a simulated window, requests past
+# the budget get a 429, and each request can be delayed by a fixed latency. Per-endpoint request counts
+# are kept so benchmarks can report requests per stored post.
+#
+# Point the extractors at it with REDDIT_URL / REDDIT_OAUTH_URL (see reddit_client.endpoint_overrides).
+
+import argparse
+import csv
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+from .config import RAW_DATA_DIR, START_TIMESTAMP
+from .parquet_store import parse_legacy_comments
+
+LISTING_PATH = re.compile(r'^/r/([^/]+)/new(?:\.json)?/?$')
+COMMENTS_PATH = re.compile(r'^/comments/([^/.]+)(?:\.json)?/?$')
+DAY_SECONDS = 24 * 60 * 60
+
+
+# ---------- FIXTURES ----------
+def _read_rows(csv_file):
+    with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def load_fixtures(raw_files, time_shift=None):
+    """Build {subreddit: [post, ...]} newest-first and {post_id: [comment, ...]} from raw CSVs.
+
+    Timestamps are shifted so the newest file's posts land in the extractor's current time window
+    (yesterday UTC); older files then fall before it, which exercises the early pagination stop.
+    """
+    raw_files = sorted(raw_files)
+    rows_by_file = [_read_rows(f) for f in raw_files]
+    if time_shift is None:
+        newest_created = [float(row['created_utc']) for row in rows_by_file[-1]]
+        window_day = int(min(newest_created)) // DAY_SECONDS * DAY_SECONDS
+        time_shift = START_TIMESTAMP - window_day
+
+    posts_by_subreddit = {}
+    comments_by_post = {}
+    for rows in rows_by_file:
+        for row in rows:
+            post_id = row['id']
+            comments = parse_legacy_comments(row['top_comments'])
+            for rank, comment in enumerate(comments):
+                comment['comment_id'] = f"{post_id}c{rank}"
+            comments_by_post[post_id] = comments
+            posts_by_subreddit.setdefault(row['subreddit'], []).append({
+                'id': post_id,
+                'name': f"t3_{post_id}",
+                'title': row['title'],
+                'selftext': row['selftext'],
+                'score': int(float(row['score'] or 0)),
+                'created_utc': float(row['created_utc']) + time_shift,
+                'num_comments': int(float(row['num_comments'] or 0)),
+                'subreddit': row['subreddit'],
+                'author': 'fixture_author',
+                'permalink': f"/r/{row['subreddit']}/comments/{post_id}/",
+            })
+
+    for posts in posts_by_subreddit.values():
+        posts.sort(key=lambda post: post['created_utc'], reverse=True)
+    return posts_by_subreddit, comments_by_post
+
+
+def _listing(children, after=None):
+    return {'kind': 'Listing', 'data': {'after': after, 'before': None, 'dist': len(children), 'children': children}}
+
+
+def _comment_thing(post, comment):
+    return {'kind': 't1', 'data': {
+        'id': comment['comment_id'],
+        'name': f"t1_{comment['comment_id']}",
+        'body': comment['comment_body'],
+        'score': comment['comment_score'],
+        'author': comment['comment_author'],
+        'parent_id': post['name'],
+        'link_id': post['name'],
+        'subreddit': post['subreddit'],
+        'replies': '',
+    }}
+
+
+# ---------- SERVER ----------
+class FakeReddit:
+    def __init__(self, posts_by_subreddit, comments_by_post, latency_ms=50, rate_limit=1000, window_seconds=600):
+        self.posts_by_subreddit = posts_by_subreddit
+        self.comments_by_post = comments_by_post
+        self.posts_by_id = {p['id']: p for posts in posts_by_subreddit.values() for p in posts}
+        self.latency = latency_ms / 1000
+        self.rate_limit = rate_limit
+        self.window_seconds = window_seconds
+
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._used = 0
+        self.request_counts = Counter()
+        self.server = None
+
+    # ----- rate-limit window -----
+    def _take_request(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= self.window_seconds:
+                self._window_start, self._used = now, 0
+            self._used += 1
+            reset = max(0.0, self.window_seconds - (now - self._window_start))
+            allowed = self._used <= self.rate_limit
+            headers = {
+                'x-ratelimit-used': str(self._used),
+                'x-ratelimit-remaining': f"{max(0, self.rate_limit - self._used):.1f}",
+                'x-ratelimit-reset': str(int(reset)),
+            }
+            return allowed, headers
+
+    def reset_counts(self):
+        with self._lock:
+            self.request_counts.clear()
+
+    # ----- endpoints -----
+    def listing(self, subreddit, params):
+        posts = self.posts_by_subreddit.get(subreddit, [])
+        limit = min(int(params.get('limit', 25)), 100)
+        start = 0
+        after = params.get('after')
+        if after:
+            ids = [p['name'] for p in posts]
+            start = ids.index(after) + 1 if after in ids else len(posts)
+        page = posts[start:start + limit]
+        next_after = page[-1]['name'] if page and start + limit < len(posts) else None
+        return _listing([{'kind': 't3', 'data': post} for post in page], next_after)
+
+    def comments(self, post_id, params):
+        post = self.posts_by_id.get(post_id)
+        if post is None:
+            return None
+        limit = int(params.get('limit', 200))
+        comments = self.comments_by_post.get(post_id, [])[:limit]
+        return [
+            _listing([{'kind': 't3', 'data': post}]),
+            _listing([_comment_thing(post, comment) for comment in comments]),
+        ]
+
+    def handle(self, method, path, params):
+        if path.startswith('/api/v1/access_token'):
+            return 'token', 200, {'access_token': 'fake-token', 'token_type': 'bearer', 'expires_in': 86400, 'scope': '*'}
+        match = LISTING_PATH.match(path)
+        if match and method == 'GET':
+            return 'listing', 200, self.listing(match.group(1), params)
+        match = COMMENTS_PATH.match(path)
+        if match and method == 'GET':
+            body = self.comments(match.group(1), params)
+            return 'comments', (200 if body is not None else 404), body or {'error': 404}
+        return 'unknown', 404, {'error': 404}
+
+    def make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self, method):
+                parsed = urlparse(self.path)
+                params = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+                if method == 'POST':
+                    length = int(self.headers.get('Content-Length') or 0)
+                    self.rfile.read(length)
+
+                time.sleep(fake.latency)
+                allowed, rate_headers = fake._take_request()
+                endpoint, status, body = fake.handle(method, parsed.path, params)
+                if not allowed and endpoint != 'token':
+                    status, body = 429, {'message': 'Too Many Requests', 'error': 429}
+                with fake._lock:
+                    fake.request_counts[endpoint] += 1
+
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=UTF-8')
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in rate_headers.items():
+                    self.send_header(name, value)
+                if status == 429:
+                    self.send_header('Retry-After', rate_headers['x-ratelimit-reset'])
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._respond('GET')
+
+            def do_POST(self):
+                self._respond('POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self, host='127.0.0.1', port=0):
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self.server.server_address[1]}"
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def default_fixture_files(days=2, raw_dir=RAW_DATA_DIR):
+    return sorted(Path(raw_dir).glob("Reddit_CarAdvice_*.csv"))[-days:]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve raw CSV fixtures as a local Reddit stand-in")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--days", type=int, default=2, help="Number of most recent raw CSVs to replay")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--rate-limit", type=int, default=1000, help="Requests allowed per window")
+    parser.add_argument("--window-seconds", type=int, default=600)
+    args = parser.parse_args()
+
+    fake = FakeReddit(*load_fixtures(default_fixture_files(args.days)), latency_ms=args.latency_ms,
+                      rate_limit=args.rate_limit, window_seconds=args.window_seconds)
+    url = fake.start(port=args.port)
+    print(f"Fake Reddit serving on {url} (REDDIT_URL={url} REDDIT_OAUTH_URL={url})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
@@ -5,6 +5,8 @@ from prefect.tasks import task_input_hash
 from datetime import timedelta
 import logging
 from .scraper import extract_reddit_data
+from .async_scraper import run_async_extraction
+from .config import EXTRACTION_MODE
 # from extractor import extract_reddit_data
 
 
@@ -26,8 +28,11 @@ sys.path.append(str(PYTHON_SCRIPTS_DIR))
 )
 def extract_task():
     logger = get_run_logger()
-    logger.info("🔁 Starting Reddit data extraction...")
-    extract_reddit_data()
+    logger.info(f"🔁 Starting Reddit data extraction ({EXTRACTION_MODE} mode)...")
+    if EXTRACTION_MODE == "async":
+        run_async_extraction()
+    else:
+        extract_reddit_data()
     logger.info("✅ Finished Reddit data extraction.")
 
 @flow(name="Reddit Pipeline")
@@ -0,0 +1,223 @@
+# This file contains the partitioned Parquet raw store (writer + reader)
+#
+# Layout, where date is the day of the daily raw file (same date as Reddit_CarAdvice_YYYY-MM-DD.csv):
+#   data/raw/parquet/posts/date=YYYY-MM-DD/subreddit=<name>/part.N.parquet   one row per post
+#   data/raw/parquet/comments/date=YYYY-MM-DD/part.N.parquet                 one row per kept comment (post_id, rank)
+# Columns are typed and compressed, and the readers only load the requested columns from the partitions
+# that match the date/subreddit filters. The old flattened top_comments string is not stored any more;
+# top_comments_view() rebuilds it from the comments table for tools that still need it.
+
+import re
+import fastparquet
+import pandas as pd
+from pathlib import Path
+from .config import POSTS_PARQUET_DIR, COMMENTS_PARQUET_DIR, PARQUET_COMPRESSION, RAW_DATA_DIR
+
+POST_PARTITIONS = ['date', 'subreddit']
+COMMENT_PARTITIONS = ['date']
+
+POST_DTYPES = {
+    'id': 'object',
+    'title': 'object',
+    'selftext': 'object',
+    'score': 'int64',
+    'created_utc': 'float64',
+    'num_comments': 'int64',
+    'subreddit': 'object',
+    'scraping_time_utc': 'int64',
+}
+
+COMMENT_DTYPES = {
+    'post_id': 'object',
+    'comment_rank': 'int64',
+    'comment_id': 'object',
+    'comment_author': 'object',
+    'comment_score': 'int64',
+    'comment_body': 'object',
+}
+
+DATE_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2})')
+LEGACY_COMMENT_START = re.compile(r'^(\S+) \(Score: (-?\d+)\): (.*)$')
+
+
+def date_for_file(path):
+    match = DATE_PATTERN.search(Path(path).name)
+    if not match:
+        raise ValueError(f"No YYYY-MM-DD date in file name: {path}")
+    return match.group(1)
+
+
+def _typed(df, dtypes, date_str):
+    df = df[[column for column in df.columns if column in dtypes or column.endswith('_datetime_utc')]].copy()
+    for column, dtype in dtypes.items():
+        if column not in df.columns:
+            continue
+        if dtype == 'object':
+            df[column] = df[column].fillna('').astype(str)
+        else:
+            df[column] = pd.to_numeric(df[column], errors='coerce').fillna(0).astype(dtype)
+    for column in ('created_datetime_utc', 'scraping_datetime_utc'):
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column])
+    df['date'] = date_str
+    return df
+
+
+def _has_dataset(root):
+    return (Path(root) / "_metadata").exists()
+
+
+def _write(df, root, partitions):
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    fastparquet.write(
+        str(root),
+        df,
+        partition_on=partitions,
+        file_scheme='hive',
+        compression=PARQUET_COMPRESSION,
+        append=_has_dataset(root),
+        write_index=False
+    )
+
+
+def write_posts(df, date_str, root=POSTS_PARQUET_DIR):
+    if df.empty:
+        return 0
+    _write(_typed(df, POST_DTYPES, date_str), root, POST_PARTITIONS)
+    return len(df)
+
+
+def write_comments(df, date_str, root=COMMENTS_PARQUET_DIR):
+    if df.empty:
+        return 0
+    _write(_typed(df, COMMENT_DTYPES, date_str), root, COMMENT_PARTITIONS)
+    return len(df)
+
+
+def _filters(start_date=None, end_date=None, subreddits=None):
+    filters = []
+    if start_date:
+        filters.append(('date', '>=', str(start_date)))
+    if end_date:
+        filters.append(('date', '<=', str(end_date)))
+    if subreddits:
+        filters.append(('subreddit', 'in', list(subreddits)))
+    return filters
+
+
+def _read(root, columns, filters, key):
+    # Filters on the partition columns prune whole directories before any file is opened
+    if not _has_dataset(root):
+        return None
+    pf = fastparquet.ParquetFile(str(root))
+    read_columns = None
+    if columns is not None:
+        read_columns = list(columns)
+        for column in key:
+            if column not in read_columns:
+                read_columns.append(column)
+    df = pf.to_pandas(columns=read_columns, filters=filters)
+    # A retried run may have appended a chunk twice; the last copy wins
+    df = df.drop_duplicates(key, keep='last')
+    if columns is not None:
+        df = df[[column for column in df.columns if column in columns]]
+    return df.reset_index(drop=True)
+
+
+def read_posts(columns=None, start_date=None, end_date=None, subreddits=None, root=POSTS_PARQUET_DIR):
+    return _read(root, columns, _filters(start_date, end_date, subreddits), ['id'])
+
+
+def read_comments(columns=None, start_date=None, end_date=None, post_ids=None, root=COMMENTS_PARQUET_DIR):
+    df = _read(root, columns, _filters(start_date, end_date), ['post_id', 'comment_rank'])
+    if df is not None and post_ids is not None:
+        df = df[df['post_id'].isin(set(post_ids))].reset_index(drop=True)
+    return df
+
+
+def comments_by_post(comments_df):
+    # {post_id: [comment records in rank order]}, the shape the extractor produced before flattening
+    if comments_df is None or comments_df.empty:
+        return {}
+    records = {}
+    ordered = comments_df.sort_values(['post_id', 'comment_rank'])
+    for row in ordered[['post_id', 'comment_id', 'comment_body', 'comment_score', 'comment_author']].itertuples(index=False):
+        records.setdefault(row.post_id, []).append({
+            'comment_id': row.comment_id,
+            'comment_body': row.comment_body,
+            'comment_score': row.comment_score,
+            'comment_author': row.comment_author
+        })
+    return records
+
+
+def format_top_comments(comments):
+    return "\n\n".join(
+        f"{c['comment_author']} (Score: {c['comment_score']}): {c['comment_body']}"
+        for c in comments
+    )
+
+
+def top_comments_view(posts_df, comments_df):
+    # Derived legacy column: the flattened "author (Score: n): body" string of the old daily CSVs
+    records = comments_by_post(comments_df)
+    return posts_df['id'].map(lambda post_id: format_top_comments(records.get(post_id, [])))
+
+
+def comments_frame(posts):
+    rows = []
+    for post in posts:
+        for rank, comment in enumerate(post['top_comments']):
+            rows.append({'post_id': post['id'], 'comment_rank': rank, **comment})
+    return pd.DataFrame(rows, columns=list(COMMENT_DTYPES))
+
+
+def parse_legacy_comments(block):
+    # Best-effort split of an old top_comments string; comment ids were never stored in it
+    comments = []
+    if not isinstance(block, str):
+        return comments
+    for line in block.splitlines():
+        match = LEGACY_COMMENT_START.match(line)
+        if match:
+            comments.append({
+                'comment_id': '',
+                'comment_author': match.group(1),
+                'comment_score': int(match.group(2)),
+                'comment_body': match.group(3)
+            })
+        elif comments:
+            comments[-1]['comment_body'] += '\n' + line
+    # Drop the blank separator lines that format_top_comments put between comments
+    for comment in comments:
+        comment['comment_body'] = comment['comment_body'].rstrip('\n')
+    return comments
+
+
+def has_date(date_str, root=POSTS_PARQUET_DIR):
+    return _has_dataset(root) and (Path(root) / f"date={date_str}").exists()
+
+
+def convert_csv_history(raw_dir=RAW_DATA_DIR):
+    # One-off migration of the existing daily CSVs into the store (days already present are skipped)
+    converted = 0
+    for csv_file in sorted(Path(raw_dir).glob("Reddit_CarAdvice_*.csv")):
+        date_str = date_for_file(csv_file)
+        if has_date(date_str):
+            continue
+        df = pd.read_csv(csv_file, dtype={'id': str}, keep_default_na=False, na_values=[""]).drop_duplicates('id', keep='last')
+        posts = [
+            {'id': post_id, 'top_comments': parse_legacy_comments(block)}
+            for post_id, block in zip(df['id'], df['top_comments'])
+        ]
+        write_comments(comments_frame(posts), date_str)
+        write_posts(df, date_str)
+        converted += 1
+        print(f"Converted {csv_file.name} ({len(df)} posts)")
+    print(f"Converted {converted} daily file(s) into {POSTS_PARQUET_DIR.parent}")
+    return converted
+
+
+if __name__ == "__main__":
+    convert_csv_history()
@@ -0,0 +1,133 @@
+# rate_governor.py — Adaptive rate limiting driven by Reddit's X-Ratelimit-* headers
+#
+# Every Reddit call (PRAW listings, comment fetches, the JSON listing path) goes through RateGovernor.call.
+# Instead of fixed sleeps, the governor spends whatever quota Reddit reports as remaining and only waits
+# when the budget runs low or Reddit answers with a 429. Time spent waiting is tracked for the run report.
+
+import threading
+import time
+from .config import RATE_LIMIT_MIN_REMAINING, RATE_LIMIT_MAX_RETRIES, RATE_LIMIT_BACKOFF_SECONDS
+
+
+def _status_code(obj):
+    # httpx responses carry status_code directly; prawcore/httpx exceptions carry it on .response
+    if hasattr(obj, 'status_code'):
+        return obj.status_code
+    response = getattr(obj, 'response', None)
+    return getattr(response, 'status_code', None)
+
+
+def _retry_after(obj):
+    response = obj if hasattr(obj, 'headers') else getattr(obj, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after') or headers.get('x-ratelimit-reset'))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateGovernor:
+    def __init__(self, reddit=None, min_remaining=RATE_LIMIT_MIN_REMAINING,
+                 max_retries=RATE_LIMIT_MAX_RETRIES, backoff_seconds=RATE_LIMIT_BACKOFF_SECONDS, client_for_thread=None):
+        # client_for_thread: with one Reddit instance per worker thread, returns the calling thread's instance,
+        # whose prawcore limits are read after each call instead of the shared reddit's
+        self.reddit = reddit
+        self.client_for_thread = client_for_thread
+        self.min_remaining = min_remaining
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+
+        self._lock = threading.Lock()
+        self._remaining = None   # requests left in the current window, None until Reddit tells us
+        self._reset_at = None    # time.monotonic() at which the window resets
+
+        self.requests = 0
+        self.rate_limited_responses = 0
+        self.throttle_events = 0
+        self.throttled_seconds = 0.0  # summed across worker threads
+
+    # ---------- STATE UPDATES ----------
+    def update(self, remaining, reset_seconds):
+        with self._lock:
+            if remaining is not None:
+                self._remaining = float(remaining)
+            if reset_seconds is not None:
+                self._reset_at = time.monotonic() + float(reset_seconds)
+
+    def update_from_headers(self, headers):
+        def _float(name):
+            try:
+                return float(headers.get(name))
+            except (TypeError, ValueError):
+                return None
+
+        self.update(_float('x-ratelimit-remaining'), _float('x-ratelimit-reset'))
+
+    def update_from_praw(self):
+        # prawcore keeps the last seen rate-limit headers in reddit.auth.limits
+        reddit = self.client_for_thread() if self.client_for_thread is not None else self.reddit
+        limits = getattr(getattr(reddit, 'auth', None), 'limits', None) or {}
+        remaining = limits.get('remaining')
+        reset_timestamp = limits.get('reset_timestamp')
+        reset_seconds = max(0.0, reset_timestamp - time.time()) if reset_timestamp else None
+        self.update(remaining, reset_seconds)
+
+    # ---------- WAITING ----------
+    def _sleep(self, seconds):
+        if seconds <= 0:
+            return
+        with self._lock:
+            self.throttle_events += 1
+            self.throttled_seconds += seconds
+        time.sleep(seconds)
+
+    def before_request(self):
+        wait = 0.0
+        with self._lock:
+            self.requests += 1
+            if self._remaining is not None:
+                if self._remaining <= self.min_remaining and self._reset_at is not None:
+                    wait = max(0.0, self._reset_at - time.monotonic())
+                    # The window will have reset by the time we wake up; wait for fresh headers
+                    self._remaining = None
+                else:
+                    # Reserve one request so concurrent workers don't overspend the budget
+                    self._remaining -= 1
+        self._sleep(wait)
+
+    def on_rate_limited(self, attempt, retry_after=None):
+        with self._lock:
+            self.rate_limited_responses += 1
+            self._remaining = 0
+        self._sleep(retry_after if retry_after else self.backoff_seconds * (2 ** attempt))
+
+    # ---------- MAIN ENTRY POINT ----------
+    def call(self, fn, *args, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            self.before_request()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if _status_code(e) == 429 and attempt < self.max_retries:
+                    self.on_rate_limited(attempt, _retry_after(e))
+                    continue
+                raise
+            finally:
+                if self.reddit is not None or self.client_for_thread is not None:
+                    self.update_from_praw()
+
+            if hasattr(result, 'headers'):
+                self.update_from_headers(result.headers)
+            if _status_code(result) == 429 and attempt < self.max_retries:
+                self.on_rate_limited(attempt, _retry_after(result))
+                continue
+            return result
+        return result
+
+    def report(self):
+        return {
+            'requests': self.requests,
+            'rate_limited_responses': self.rate_limited_responses,
+            'throttle_events': self.throttle_events,
+            'throttled_seconds': round(self.throttled_seconds, 2)
+        }
@@ -2,10 +2,34 @@
 
 import praw
 import os
+import threading
+
+_local = threading.local()
+
+
+def endpoint_overrides():
+    # Point PRAW at a stand-in server (see fake_reddit.py) for offline runs and benchmarks
+    overrides = {}
+    if os.getenv('REDDIT_OAUTH_URL'):
+        overrides['oauth_url'] = os.environ['REDDIT_OAUTH_URL']
+    if os.getenv('REDDIT_URL'):
+        overrides['reddit_url'] = os.environ['REDDIT_URL']
+    return overrides
+
 
 def get_reddit_client():
     return praw.Reddit(
         client_id=os.environ['REDDIT_CLIENT_ID'],
         client_secret=os.environ['REDDIT_CLIENT_SECRET'],
-        user_agent=os.environ['REDDIT_USER_AGENT']
+        user_agent=os.environ['REDDIT_USER_AGENT'],
+        **endpoint_overrides()
     )
+
+
+def get_thread_client():
+    # PRAW/prawcore keep their HTTP session and rate-limit state per instance and are not thread-safe,
+    # so every worker thread gets (and keeps) its own Reddit instance
+    reddit = getattr(_local, 'reddit', None)
+    if reddit is None:
+        reddit = _local.reddit = get_reddit_client()
+    return reddit
@@ -2,13 +2,14 @@
 
 import time
 import logging
-import pandas as pd
-import os
-from .config import *
-from .reddit_client import get_reddit_client
-from .utils import fetch_posts_with_praw, process_comments
-from .writer import save_data
-from prefect import get_run_logger
+from .config import SUBREDDITS, MAX_POSTS_PER_SUBREDDIT, START_TIMESTAMP, END_TIMESTAMP, CSV_FILE
+from .reddit_client import get_thread_client
+from .utils import fetch_posts_with_praw
+from .comment_fetcher import CommentFetcher
+from .writer import ChunkedWriter
+from .rate_governor import RateGovernor
+from .seen_index import SeenPostIndex
+from .watermarks import load_watermarks, save_watermarks, listing_lower_bound, newest_in_window, hold_for_retry
 
 # Setup module-level logger
 logger = logging.getLogger(__name__)
@@ -21,26 +22,89 @@ if not logger.handlers:
     console_handler.setFormatter(formatter)
     logger.addHandler(console_handler)
 
-def extract_reddit_data():
-    start_time = time.time()
-    reddit = get_reddit_client()
-
-    counters = {
+def new_counters():
+    return {
         'total_posts_fetched': 0,
         'posts_filtered_time': 0,
         'posts_filtered_comments': 0,
         'comments_skipped': 0,
+        'posts_skipped_known': 0,
         'valid_posts_stored': 0
     }
 
-    all_posts = []
+
+def is_candidate(submission):
+    # Cheap listing-level filters; only these posts cost a comment request
+    return START_TIMESTAMP <= submission.created_utc <= END_TIMESTAMP and submission.num_comments > 0
+
+
+def build_post_entry(submission, subreddit, comments):
+    return {
+        'id': submission.id,
+        'title': submission.title,
+        'selftext': submission.selftext,
+        'score': submission.score,
+        'created_utc': submission.created_utc,
+        'num_comments': submission.num_comments,
+        'subreddit': subreddit,
+        'top_comments': comments
+    }
+
+
+def chunk_written(posts, writer, seen_index, work_queue=None):
+    # Called once a chunk is durable: its posts count as seen, and with a work queue they go to the cleaner
+    seen_index.mark_written(posts, writer.output_marker)
+    if work_queue is not None:
+        work_queue.put(writer.date_str, posts)
+
+
+def log_counters(counters, start_time, governor=None):
+    # print("\n=== Debugging Counters ===")
+    logger.info("\n=== Debugging Counters ===")
+    for key, value in counters.items():
+        # print(f"{key}: {value}")
+        logger.info(f"{key}: {value}")
+
+    if governor is not None:
+        logger.info("\n=== Rate Governor ===")
+        for key, value in governor.report().items():
+            logger.info(f"{key}: {value}")
+
+    # print(f"\nCompleted in {(time.time() - start_time) / 60:.2f} minutes")
+    logger.info(f"\nCompleted in {(time.time() - start_time) / 60:.2f} minutes")
+
+
+def extract_reddit_data(work_queue=None):
+    start_time = time.time()
+    reddit = get_thread_client()
+    governor = RateGovernor(client_for_thread=get_thread_client)
+    comment_fetcher = CommentFetcher(governor)
+    seen_index = SeenPostIndex()
+    watermarks = load_watermarks()
+
+    counters = new_counters()
+
+    # Posts are streamed to disk in chunks; the seen-post index (and the work queue, if any) is updated as each
+    # chunk becomes durable
+    writer = ChunkedWriter(CSV_FILE, on_flush=lambda posts: chunk_written(posts, writer, seen_index, work_queue))
+    new_watermarks = dict(watermarks)
 
     for subreddit in SUBREDDITS:
         # print(f"\n=== Starting r/{subreddit} ===")
         logger.info(f"=== Starting r/{subreddit} ===")
         post_count = 0
 
-        posts = fetch_posts_with_praw(reddit, subreddit, limit=MAX_POSTS_PER_SUBREDDIT)
+        stop_before, exclusive = listing_lower_bound(watermarks, subreddit)
+        posts = fetch_posts_with_praw(reddit, subreddit, limit=MAX_POSTS_PER_SUBREDDIT, governor=governor,
+                                      stop_before=stop_before, exclusive=exclusive)
+        newest = newest_in_window(posts, watermarks.get(subreddit))
+        unfinished = []
+
+        # Comment slices for the whole listing are fetched up front, a few requests in flight at a time.
+        # Posts already written with the same content are skipped entirely.
+        candidates = [submission for submission in posts if is_candidate(submission)]
+        known = seen_index.known_unchanged(candidates)
+        prefetched = comment_fetcher.fetch_many(c.id for c in candidates if c.id not in known)
 
         for submission in posts:
             counters['total_posts_fetched'] += 1
@@ -54,44 +118,41 @@ def extract_reddit_data():
             if submission.num_comments == 0:
                 counters['posts_filtered_comments'] += 1
                 continue
+            if submission.id in known:
+                counters['posts_skipped_known'] += 1
+                continue
 
             try:
-                comments = process_comments(submission, counters)
+                comments, post_counters = prefetched[submission.id]
+                counters['comments_skipped'] += post_counters['comments_skipped']
 
                 if comments:
-                    post_entry = {
-                        'id': submission.id,
-                        'title': submission.title,
-                        'selftext': submission.selftext,
-                        'score': submission.score,
-                        'created_utc': submission.created_utc,
-                        'num_comments': submission.num_comments,
-                        'subreddit': subreddit,
-                        'top_comments': comments
-                    }
-
-                    all_posts.append(post_entry)
+                    post_entry = build_post_entry(submission, subreddit, comments)
+
+                    writer.add(post_entry)
                     post_count += 1
                     counters['valid_posts_stored'] += 1
 
                     if post_count % 10 == 0:
                         print(f"Collected {post_count} posts from r/{subreddit}")
                         logger.info(f"Collected {post_count} posts from r/{subreddit} ===")
+                else:
+                    unfinished.append(submission)
 
             except Exception as e:
                 # print(f"Error processing post {submission.id}: {e}")
                 logger.info(f"Error processing post {submission.id}: {e} ===")
+                unfinished.append(submission)
                 continue
 
-            time.sleep(1)
-
-    save_data(all_posts, counters, CSV_FILE)
-
-    # print("\n=== Debugging Counters ===")
-    logger.info("\n=== Debugging Counters ===")
-    for key, value in counters.items():
-        # print(f"{key}: {value}")
-        logger.info(f"{key}: {value}")
-
-    # print(f"\nCompleted in {(time.time() - start_time) / 60:.2f} minutes")
-    logger.info(f"\nCompleted in {(time.time() - start_time) / 60:.2f} minutes")
+        writer.flush()
+        newest = hold_for_retry(newest, unfinished)
+        if newest is not None:
+            new_watermarks[subreddit] = newest
+
+    writer.finalize()
+    comment_fetcher.close()
+    seen_index.close()
+    # Only advance the watermarks once the data is safely in the daily file
+    save_watermarks(new_watermarks)
+    log_counters(counters, start_time, governor)
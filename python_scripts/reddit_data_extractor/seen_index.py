@@ -0,0 +1,64 @@
+# This file contains the on-disk index of posts that were already written to a raw file
+#
+# Keyed by post id with a hash of the fields that decide whether a post needs re-fetching (title, selftext,
+# num_comments). Score is left out on purpose, it changes on every run. A post counts as known only while the
+# file it was written to (or its staged chunks) still exists, so deleting a daily CSV makes the next run fetch it again.
+
+import hashlib
+import sqlite3
+import time
+from pathlib import Path
+from .config import SEEN_INDEX_FILE, STAGING_DIR
+
+
+def content_hash(title, selftext, num_comments):
+    payload = f"{title}\0{selftext}\0{num_comments}".encode("utf-8")
+    return hashlib.sha1(payload).hexdigest()
+
+
+def submission_hash(submission):
+    return content_hash(submission.title, submission.selftext, submission.num_comments)
+
+
+class SeenPostIndex:
+    def __init__(self, path=SEEN_INDEX_FILE):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen_posts ("
+            " id TEXT PRIMARY KEY,"
+            " content_hash TEXT NOT NULL,"
+            " output_file TEXT NOT NULL,"
+            " last_written INTEGER NOT NULL)"
+        )
+        self.conn.commit()
+
+    def is_unchanged(self, post_id, post_hash):
+        row = self.conn.execute(
+            "SELECT content_hash, output_file FROM seen_posts WHERE id = ?", (post_id,)
+        ).fetchone()
+        if row is None or row[0] != post_hash:
+            return False
+        output_file = Path(row[1])
+        return output_file.exists() or (STAGING_DIR / output_file.stem).exists()
+
+    def known_unchanged(self, submissions):
+        return {submission.id for submission in submissions
+                if self.is_unchanged(submission.id, submission_hash(submission))}
+
+    def mark_written(self, posts, output_file):
+        now = int(time.time())
+        self.conn.executemany(
+            "INSERT INTO seen_posts (id, content_hash, output_file, last_written) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET content_hash = excluded.content_hash, "
+            "output_file = excluded.output_file, last_written = excluded.last_written",
+            [
+                (post['id'], content_hash(post['title'], post['selftext'], post['num_comments']), str(output_file), now)
+                for post in posts
+            ]
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
@@ -1,28 +1,53 @@
 # This file contains Helpers: fetch_posts, process_comments
 
-import praw
-from .config import headers
-from datetime import datetime
+from .config import POST_LIMIT_PER_PAGE, BOT_PHRASES, TOP_COMMENTS_PER_POST
 
 
-def fetch_posts_with_praw(reddit, subreddit_name, limit=100):
+def _governed(governor, fn, *args, **kwargs):
+    if governor is None:
+        return fn(*args, **kwargs)
+    return governor.call(fn, *args, **kwargs)
+
+
+def fetch_posts_with_praw(reddit, subreddit_name, limit=100, governor=None, stop_before=None, exclusive=False):
+    # /new is sorted newest-first, so once a post falls below stop_before every later page would too.
+    # Pages are pulled lazily (one request per POST_LIMIT_PER_PAGE items) and pagination stops right there.
+    # With exclusive=True a post created exactly at stop_before also stops the walk (watermarks).
+    posts = []
     try:
         subreddit = reddit.subreddit(subreddit_name)
-        return list(subreddit.new(limit=limit))
+        listing = subreddit.new(limit=limit)
+        while True:
+            if len(posts) % POST_LIMIT_PER_PAGE == 0:
+                submission = _governed(governor, next, listing, None)
+            else:
+                submission = next(listing, None)
+            if submission is None:
+                break
+            if stop_before is not None and (
+                    submission.created_utc < stop_before or (exclusive and submission.created_utc == stop_before)):
+                print(f"Reached the time window edge in r/{subreddit_name} after {len(posts)} posts")
+                break
+            posts.append(submission)
+        return posts
     except Exception as e:
         print(f"Error fetching posts from r/{subreddit_name}: {e}")
-        return []
+        return posts
+
+
+def is_bot_comment(body):
+    return any(bot_phrase in body for bot_phrase in BOT_PHRASES)
 
 
-def process_comments(submission, counters):
+def process_comments(submission, counters, governor=None):
     try:
-        submission.comments.replace_more(limit=0)
+        # Reading submission.comments is what fetches the thread; replace_more(limit=0) only drops the stubs
+        forest = _governed(governor, lambda: submission.comments)
+        forest.replace_more(limit=0)
         valid_comments = []
 
-        for comment in submission.comments[:3]:
-            if any(bot_phrase in comment.body for bot_phrase in [
-                "Thanks for posting", "I am a bot", "Please read the rules"
-            ]):
+        for comment in forest[:TOP_COMMENTS_PER_POST]:
+            if is_bot_comment(comment.body):
                 counters['comments_skipped'] += 1
                 continue
 
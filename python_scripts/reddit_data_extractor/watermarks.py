@@ -0,0 +1,53 @@
+# This file contains the per-subreddit watermark store (newest created_utc already extracted)
+
+import json
+import os
+from .config import WATERMARK_FILE, USE_WATERMARKS, START_TIMESTAMP, END_TIMESTAMP
+
+
+def load_watermarks(path=WATERMARK_FILE):
+    if not USE_WATERMARKS or not path.exists():
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable watermark file {path}: {e}")
+        return {}
+
+
+def save_watermarks(watermarks, path=WATERMARK_FILE):
+    if not USE_WATERMARKS:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(watermarks, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def listing_lower_bound(watermarks, subreddit):
+    # Anything at or below the watermark was already handled by an earlier run over this window
+    watermark = watermarks.get(subreddit)
+    if watermark is not None and watermark >= START_TIMESTAMP:
+        return watermark, True
+    return START_TIMESTAMP, False
+
+
+def newest_in_window(posts, previous=None):
+    # Only posts inside the window may advance the watermark, otherwise tomorrow's run would skip today's posts
+    newest = previous
+    for submission in posts:
+        if START_TIMESTAMP <= submission.created_utc <= END_TIMESTAMP:
+            if newest is None or submission.created_utc > newest:
+                newest = submission.created_utc
+    return newest
+
+
+def hold_for_retry(newest, unfinished):
+    # Posts whose comment fetch failed or returned nothing usable must come up again in the next run's listing,
+    # so the watermark stays just below the oldest of them (the listing stops at or below the watermark)
+    if not unfinished:
+        return newest
+    floor = min(submission.created_utc for submission in unfinished) - 1
+    return floor if newest is None else min(newest, floor)
@@ -0,0 +1,131 @@
+# This file contains the durable work queue that hands extracted posts to the LLM cleaner
+#
+# One SQLite table of items keyed by (day, post id), each carrying the post as JSON (title, selftext and the
+# structured comment records). The extractor puts posts in as soon as their chunk is durable on disk; a consumer
+# leases a few items at a time, acks them once their result is journaled, or releases them to be retried.
+# A lease that is not acked within WORK_QUEUE_LEASE_SECONDS expires and the item becomes available again, so a
+# crashed consumer only loses the items it had in flight. Items that were leased WORK_QUEUE_MAX_ATTEMPTS times
+# are given up on. The producer marks a day finished once extraction is over, which tells consumers when to stop.
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from .config import WORK_QUEUE_FILE, WORK_QUEUE_LEASE_SECONDS, WORK_QUEUE_MAX_ATTEMPTS
+
+
+class WorkQueue:
+    def __init__(self, path=WORK_QUEUE_FILE, lease_seconds=WORK_QUEUE_LEASE_SECONDS, max_attempts=WORK_QUEUE_MAX_ATTEMPTS):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Producer and consumer may be different processes; WAL lets one write while the other reads, and
+        # explicit transactions (isolation_level=None) make a lease a single atomic claim
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            " item_id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " day TEXT NOT NULL,"
+            " post_id TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " state TEXT NOT NULL DEFAULT 'ready',"  # ready | leased | done
+            " lease_until REAL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " enqueued REAL NOT NULL,"
+            " UNIQUE (day, post_id))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS items_day_state ON items (day, state)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS producers (day TEXT PRIMARY KEY, finished REAL NOT NULL)")
+
+    def put(self, day, posts):
+        # posts: extractor post entries; a post already queued for the day (e.g. by a retried run) is kept as is
+        now = time.time()
+        rows = [
+            (day, str(post['id']), json.dumps({
+                'id': post['id'], 'title': post['title'], 'selftext': post['selftext'], 'comments': post['top_comments']
+            }, default=str), now)
+            for post in posts
+        ]
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO items (day, post_id, payload, enqueued) VALUES (?, ?, ?, ?)", rows
+            )
+            self.conn.execute("COMMIT")
+        return len(rows)
+
+    def finish(self, day):
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO producers (day, finished) VALUES (?, ?)", (day, time.time()))
+
+    def lease(self, day, limit):
+        # [(item_id, post)] claimed for lease_seconds, oldest first
+        now = time.time()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.conn.execute(
+                    "SELECT item_id, payload FROM items WHERE day = ? AND attempts < ? AND "
+                    "(state = 'ready' OR (state = 'leased' AND lease_until < ?)) ORDER BY item_id LIMIT ?",
+                    (day, self.max_attempts, now, limit)
+                ).fetchall()
+                self.conn.executemany(
+                    "UPDATE items SET state = 'leased', lease_until = ?, attempts = attempts + 1 WHERE item_id = ?",
+                    [(now + self.lease_seconds, item_id) for item_id, _ in rows]
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return [(item_id, json.loads(payload)) for item_id, payload in rows]
+
+    def ack(self, item_ids):
+        self._set_state(item_ids, "done")
+
+    def release(self, item_ids):
+        # Back to the queue right away instead of waiting for the lease to expire
+        self._set_state(item_ids, "ready")
+
+    def _set_state(self, item_ids, state):
+        if not item_ids:
+            return
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany("UPDATE items SET state = ?, lease_until = NULL WHERE item_id = ?",
+                                  [(state, item_id) for item_id in item_ids])
+            self.conn.execute("COMMIT")
+
+    def finished(self, day):
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM producers WHERE day = ?", (day,)).fetchone() is not None
+
+    def drained(self, day):
+        # True once the producer is done and nothing is left to lease or waiting on a live lease
+        with self._lock:
+            (open_items,) = self.conn.execute(
+                "SELECT COUNT(*) FROM items WHERE day = ? AND state != 'done' AND attempts < ?",
+                (day, self.max_attempts)
+            ).fetchone()
+            (leased,) = self.conn.execute(
+                "SELECT COUNT(*) FROM items WHERE day = ? AND state = 'leased' AND lease_until >= ?",
+                (day, time.time())
+            ).fetchone()
+        return self.finished(day) and open_items == 0 and leased == 0
+
+    def items(self, day):
+        # Every post queued for the day, in queue order
+        with self._lock:
+            rows = self.conn.execute("SELECT item_id, payload FROM items WHERE day = ? ORDER BY item_id", (day,)).fetchall()
+        return [(item_id, json.loads(payload)) for item_id, payload in rows]
+
+    def counts(self, day):
+        with self._lock:
+            return dict(self.conn.execute("SELECT state, COUNT(*) FROM items WHERE day = ? GROUP BY state", (day,)))
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -1,36 +1,199 @@
 # This file contains CSV and data saving logic
+#
+# ChunkedWriter takes posts as a stream. Every WRITE_CHUNK_SIZE posts (and at the end of each subreddit)
+# it writes a durable chunk (a comments file, then the posts file) into the staging directory. finalize()
+# appends the chunks to the partitioned Parquet store (posts + structured comments) and to the daily CSV
+# mirror, which carries the derived top_comments string and is swapped into place atomically. A crashed run
+# leaves its chunks behind, and the next attempt picks them up again, so peak memory is bounded by the chunk
+# size instead of the daily volume.
+# A post written again (its content changed since an earlier run) replaces its old row in the CSV mirror, so every
+# id appears once per daily file.
 
+import csv
 import pandas as pd
 import time
 import os
+import shutil
+from collections import Counter
+from pathlib import Path
+from .config import STAGING_DIR, WRITE_CHUNK_SIZE, WRITE_CSV_MIRROR, RAW_PARQUET_DIR, POSTS_PARQUET_DIR
+from .parquet_store import write_posts, write_comments, comments_frame, format_top_comments, date_for_file
 
-def save_data(all_posts, counters, CSV_FILE):
-    if not all_posts:
-        print("No posts collected.")
-        return
+PART_DTYPES = {'id': str, 'post_id': str, 'comment_id': str}
+# Only empty fields are missing values: a title or comment that reads "None", "NA" or "null" stays text
+PART_NA = {'keep_default_na': False, 'na_values': [""]}
 
-    scraping_time_unix = int(time.time())
-    for post in all_posts:
-        post['top_comments'] = "\n\n".join(
-            f"{c['comment_author']} (Score: {c['comment_score']}): {c['comment_body']}"
-            for c in post['top_comments']
-        )
-        post['scraping_time_utc'] = scraping_time_unix
+RAW_COLUMNS = [
+    'id', 'title', 'selftext', 'score', 'created_utc', 'num_comments', 'subreddit',
+    'scraping_time_utc', 'created_datetime_utc', 'scraping_datetime_utc', 'top_comments'
+]
+
+
+def posts_to_frame(posts, scraping_time_unix):
+    rows = []
+    for post in posts:
+        row = dict(post)
+        row['top_comments'] = format_top_comments(post['top_comments'])
+        row['scraping_time_utc'] = scraping_time_unix
+        rows.append(row)
 
-    df = pd.DataFrame(all_posts)
+    df = pd.DataFrame(rows)
     df['created_datetime_utc'] = pd.to_datetime(df['created_utc'], unit='s')
     df['scraping_datetime_utc'] = pd.to_datetime(df['scraping_time_utc'], unit='s')
+    return df[RAW_COLUMNS]
+
+
+def _fsync_replace(tmp_path, final_path):
+    with open(tmp_path, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, final_path)
+
+
+class ChunkedWriter:
+    def __init__(self, csv_file, chunk_size=WRITE_CHUNK_SIZE, on_flush=None):
+        self.csv_file = Path(csv_file)
+        self.csv_file.parent.mkdir(parents=True, exist_ok=True)
+        self.date_str = date_for_file(self.csv_file)
+        self.chunk_size = chunk_size
+        self.on_flush = on_flush  # called with the posts of every chunk once it is durable
+        self.staging_dir = STAGING_DIR / self.output_marker.stem
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+
+        self.buffer = []
+        self.posts_by_subreddit = Counter()
+        self.part_number = len(self._parts())  # continue after chunks left by a crashed attempt
+        if self.part_number:
+            print(f"Resuming with {self.part_number} staged chunk(s) from a previous attempt")
+
+    @property
+    def output_marker(self):
+        # The path the seen-post index records for posts written by this writer
+        if WRITE_CSV_MIRROR:
+            return self.csv_file
+        return POSTS_PARQUET_DIR / f"date={self.date_str}"
+
+    def _parts(self):
+        return sorted(self.staging_dir.glob("part-*.csv"))
+
+    @staticmethod
+    def _comments_part(part_path):
+        return part_path.with_name(part_path.name.replace("part-", "comments-"))
+
+    @staticmethod
+    def _write_staged(df, path):
+        tmp_path = path.with_suffix(".tmp")
+        df.to_csv(tmp_path, index=False)
+        _fsync_replace(tmp_path, path)
+
+    def add(self, post):
+        self.buffer.append(post)
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        # The comments file goes first: a posts part on disk means its chunk is complete
+        part_path = self.staging_dir / f"part-{self.part_number:05d}.csv"
+        self._write_staged(comments_frame(self.buffer), self._comments_part(part_path))
+        self._write_staged(posts_to_frame(self.buffer, int(time.time())), part_path)
+        self.part_number += 1
 
-    base_columns = [col for col in df.columns if col != 'top_comments']
-    column_order = base_columns + ['top_comments']
-    df = df[column_order]
+        self.posts_by_subreddit.update(post['subreddit'] for post in self.buffer)
+        if self.on_flush is not None:
+            self.on_flush(self.buffer)
+        self.buffer = []
 
-    if os.path.exists(CSV_FILE):
-        existing_df = pd.read_csv(CSV_FILE)
-        existing_df = existing_df[column_order] if 'top_comments' in existing_df.columns else existing_df
-        df = pd.concat([existing_df, df]).drop_duplicates('id', keep='last')
+    @staticmethod
+    def _part_ids(part_path):
+        return pd.read_csv(part_path, usecols=['id'], dtype=str, **PART_NA)['id'].tolist()
 
-    df.to_csv(CSV_FILE, index=False)
-    print(f"\nSaved {len(df)} posts to {CSV_FILE}")
-    print("Posts by subreddit:")
-    print(df['subreddit'].value_counts())
+    @staticmethod
+    def _copy_rows(src, out, id_index, drop_ids):
+        # Copies the CSV rows of an open file (header already consumed), keeping the last row per id and dropping
+        # ids in drop_ids. Two streaming passes: the first notes the last row number of every id, the second writes
+        # the rows out, so only the ids are held in memory. Rows are re-emitted with the same minimal quoting pandas
+        # uses, multi-line fields included.
+        start = src.tell()
+        last = {row[id_index]: n for n, row in enumerate(filter(None, csv.reader(src)))}
+        src.seek(start)
+        writer = csv.writer(out, lineterminator='\n')
+        for n, row in enumerate(filter(None, csv.reader(src))):
+            if last[row[id_index]] == n and row[id_index] not in drop_ids:
+                writer.writerow(row)
+
+    def _append_part(self, part_path, out, existing_columns, drop_ids=frozenset()):
+        if drop_ids:
+            df = pd.read_csv(part_path, dtype=PART_DTYPES, **PART_NA)
+            df = df[~df['id'].isin(drop_ids)]
+            if existing_columns is not None:
+                df = df.reindex(columns=existing_columns)
+            df.to_csv(out, header=False, index=False)
+        elif existing_columns is None or existing_columns == RAW_COLUMNS:
+            # Same layout: copy the chunk's rows byte for byte, without re-parsing them
+            with open(part_path, 'r', encoding='utf-8', newline='') as part:
+                part.readline()
+                shutil.copyfileobj(part, out)
+        else:
+            df = pd.read_csv(part_path, dtype=PART_DTYPES, **PART_NA).reindex(columns=existing_columns)
+            df.to_csv(out, header=False, index=False)
+
+    def finalize(self):
+        self.flush()
+        parts = self._parts()
+        if not parts:
+            print("No posts collected.")
+            shutil.rmtree(self.staging_dir, ignore_errors=True)
+            return 0
+
+        # Parquet first: a chunk appended twice after a crash is harmless, readers keep the last copy per id
+        for part_path in parts:
+            write_comments(pd.read_csv(self._comments_part(part_path), dtype=PART_DTYPES, **PART_NA), self.date_str)
+            write_posts(pd.read_csv(part_path, dtype=PART_DTYPES, **PART_NA), self.date_str)
+
+        if WRITE_CSV_MIRROR:
+            self._write_csv_mirror(parts)
+
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+        appended = sum(self.posts_by_subreddit.values())
+        print(f"\nAppended {appended} posts from this attempt ({len(parts)} chunk(s)) to {RAW_PARQUET_DIR}"
+              + (f" and {self.csv_file}" if WRITE_CSV_MIRROR else ""))
+        print("Posts by subreddit:")
+        for subreddit, count in self.posts_by_subreddit.most_common():
+            print(f"{subreddit}: {count}")
+        return appended
+
+    def _write_csv_mirror(self, parts):
+        # Rows of posts that are written again by a later chunk (or this attempt) are dropped from the existing
+        # file and earlier chunks, so the newest version of each post is the only one left
+        later_ids, seen = [], set()
+        for part_path in reversed(parts):
+            ids = set(self._part_ids(part_path))
+            later_ids.insert(0, ids & seen)  # ids of this chunk that a later chunk writes again
+            seen |= ids
+
+        tmp_path = self.csv_file.with_suffix(".csv.tmp")
+        existing_columns = None
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as out:
+            if self.csv_file.exists() and self.csv_file.stat().st_size > 0:
+                with open(self.csv_file, 'r', encoding='utf-8', newline='') as existing:
+                    header = existing.readline()
+                    existing_columns = next(csv.reader([header]))
+                    out.write(header if header.endswith('\n') else header + '\n')
+                    self._copy_rows(existing, out, existing_columns.index('id'), seen)
+            else:
+                out.write(','.join(RAW_COLUMNS) + '\n')
+
+            for part_path, drop_ids in zip(parts, later_ids):
+                self._append_part(part_path, out, existing_columns, drop_ids)
+
+        _fsync_replace(tmp_path, self.csv_file)
+
+
+def save_data(all_posts, counters, CSV_FILE):
+    # One-shot wrapper kept for callers that still collect everything in memory
+    writer = ChunkedWriter(CSV_FILE)
+    for post in all_posts:
+        writer.add(post)
+    writer.finalize()
@@ -0,0 +1,42 @@
+# Tests for the JSON repair of model answers in reddit_data_cleaner/postprocessor.py
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# The cleaner modules import each other by plain name, so its directory goes on the path like flow.py does
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "python_scripts" / "reddit_data_cleaner"))
+
+from postprocessor import repair_json, JSONRepairError  # noqa: E402
+
+# Known answers and what repair_json makes of them: (text, parsed result, fixes), or (text, None, None) when the
+# answer has to be unrecoverable
+REPAIR_FIXTURES = [
+    ('{"is_valid": false, "problem": null, "solution": null}', {"is_valid": False, "problem": None, "solution": None}, []),
+    ('```json\n{"is_valid": false}\n```', {"is_valid": False}, ["fenced"]),
+    ('Sure! {"is_valid": False, "problem": None} Hope this helps', {"is_valid": False, "problem": None},
+     ["extra_prose", "python_literals"]),
+    ("{'is_valid': true, 'problem': 'Won\\'t start', 'solution': 'Replace the \"main\" relay'}",
+     {"is_valid": True, "problem": "Won't start", "solution": 'Replace the "main" relay'}, ["single_quotes"]),
+    ('{"is_valid": false, "problem": null,}', {"is_valid": False, "problem": None}, ["trailing_comma"]),
+    ('{"is_valid": false, "problem": "Engine misf', {"is_valid": False, "problem": "Engine misf"}, ["truncated"]),
+    ('[{"post_id": "a", "is_valid": false}, {"post_id": "b", "is_valid": fal',
+     [{"post_id": "a", "is_valid": False}], ["truncated"]),
+    ('[{"post_id": "a", "is_valid": false}, {"post_id": "b", "is_valid": true, "problem": "Noise", "solution": "Rep',
+     [{"post_id": "a", "is_valid": False}], ["truncated"]),
+    ('{"is_valid": true, "problem": "Engine misfire at idle", "solution": "Replace the ign', None, None),
+    ('{"is_valid": true, "problem": "Engine misfire', None, None),
+    ('{"is_valid": tr', None, None),
+    ('{"is_valid": f', None, None),
+    ('The post has no solution.', None, None),
+]
+
+
+@pytest.mark.parametrize("text, expected, expected_fixes", REPAIR_FIXTURES)
+def test_repair_json(text, expected, expected_fixes):
+    if expected is None:
+        with pytest.raises(JSONRepairError):
+            repair_json(text)
+    else:
+        assert repair_json(text) == (expected, expected_fixes)